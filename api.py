@@ -0,0 +1,156 @@
+import hashlib
+from datetime import datetime, date, timedelta
+from flask import Blueprint, Response, request, jsonify, abort
+from sqlalchemy import func
+from models import Venue, Artist, Show, db
+from pagination import keyset_paginate
+from schedule import day_start
+
+#----------------------------------------------------------------------------#
+# Versioned JSON read API.
+#
+# Every response carries a strong ETag computed from the (id, updated_at)
+# pairs of the rows it contains, plus Last-Modified. Those are read with a
+# narrow query first; when the client's If-None-Match (or If-Modified-Since)
+# still matches, a 304 is returned without loading or serializing the rows.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+
+def serialize(data):
+    return {
+        key: value.isoformat() if isinstance(value, (datetime, date)) else value
+        for key, value in data.items()
+    }
+
+
+def version_tag(kind, versions):
+    digest = hashlib.sha1(kind.encode())
+    for id, updated_at in versions:
+        stamp = updated_at.isoformat() if updated_at else ''
+        digest.update(f'{id}:{stamp};'.encode())
+    return digest.hexdigest()
+
+
+def not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional(versions, kind, build):
+    etag = version_tag(kind, versions)
+    stamps = [updated_at for _, updated_at in versions if updated_at]
+    last_modified = max(stamps) if stamps else None
+
+    if not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+def model_for(entity):
+    model = MODELS.get(entity)
+    if model is None:
+        abort(404)
+    return model
+
+
+#  Detail
+#  ----------------------------------------------------------------
+@api.route('/<entity>/<int:id>')
+def detail(entity, id):
+    model = model_for(entity)
+    version = db.session.query(model.id, model.updated_at).filter(model.id == id).first()
+    if version is None:
+        abort(404)
+
+    def build():
+        return serialize(db.session.get(model, id).to_dict())
+
+    return conditional([tuple(version)], f'{entity}/{id}', build)
+
+
+#  Lists
+#  ----------------------------------------------------------------
+@api.route('/<entity>/')
+def listing(entity):
+    model = model_for(entity)
+    query = db.session.query(model.id, model.updated_at)
+    keys = [model.id]
+    args = {}
+
+    if model is Show:
+        keys = [Show.start_time, Show.id]
+        for name in ('venue_id', 'artist_id'):
+            value = request.args.get(name, type=int)
+            if value is not None:
+                query = query.filter(getattr(Show, name) == value)
+                args[name] = value
+        # date range (?from=, ?to=: ISO dates, both inclusive) and venue area
+        start, end = date_arg('from'), date_arg('to')
+        if start:
+            query = query.filter(Show.start_time >= day_start(start))
+            args['from'] = start.isoformat()
+        if end:
+            query = query.filter(Show.start_time < day_start(end + timedelta(days=1)))
+            args['to'] = end.isoformat()
+        city, state = request.args.get('city', ''), request.args.get('state', '')
+        if city or state:
+            query = query.join(Show.venue)
+            if city:
+                query = query.filter(func.lower(Venue.city) == city.lower())
+                args['city'] = city
+            if state:
+                query = query.filter(Venue.state == state)
+                args['state'] = state
+
+    page = keyset_paginate(query, keys,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           args=args)
+    versions = [(x.id, x.updated_at) for x in page]
+
+    def build():
+        ids = [id for id, _ in versions]
+        rows = {x.id: x for x in model.query.filter(model.id.in_(ids))} if ids else {}
+        return {
+            'data': [serialize(rows[id].to_dict()) for id in ids if id in rows],
+            **page.cursors(),
+        }
+
+    return conditional(versions, f'{entity}?{request.query_string.decode()}', build)
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return jsonify({'error': 'Not found.'}), 404
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return jsonify({'error': 'Bad request.'}), 400
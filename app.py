@@ -1,19 +1,39 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
+import os
 import sys
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+import weakref
+import click
+from flask import Flask, current_app, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from flask_migrate import Migrate
-from datetime import datetime, timezone
-from models import Venue, Artist, Show, db
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from models import Venue, Artist, Show, db, DEFAULT_SHOW_DURATION
+from counters import counters_cli, counter_roll_over
+from search import search_query, sort_keys, lookup, facets, search_cli
+from enums import Genres
+from pagination import keyset_paginate
+from cache import page_cache, entity_cache
+from importer import import_command
+from exporter import export, export_command, FORMATS as EXPORT_FORMATS
+from api import api
+from concurrency import run_concurrently
+from routing import read_engine
+from datefmt import format_datetime, format_many
+from explain import explain_command
+from schedule import shows_between, day_start, month_bounds, venue_month
+from metrics import metrics
+from deletion import delete_entities, delete_past_shows, delete_cli
+from booking import book, weekly_slots, Conflict
+from assets import assets, assets_cli
+from middleware import compression, cache_policy
+from warmup import init_bytecode_cache, warm_up
 
 #----------------------------------------------------------------------------#
 class FlashType:
@@ -23,27 +43,35 @@ class FlashType:
     WARNING = 'warning'
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Views.
+#
+# The views below are registered on the app(s) built by create_app(). They
+# are collected by Views rather than a Blueprint, which would prefix every
+# endpoint name (url_for('index'), page cache keys, ...).
 #----------------------------------------------------------------------------#
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db.init_app(app)
-migrate = Migrate(app, db)
-
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
-app.jinja_env.filters['datetime'] = format_datetime
+class Views:
+  def __init__(self):
+    self.registrations = []
+
+  def route(self, rule, **options):
+    def decorator(f):
+      endpoint = options.pop('endpoint', None)
+      self.registrations.append(lambda app: app.add_url_rule(rule, endpoint, f, **options))
+      return f
+    return decorator
+
+  def errorhandler(self, code):
+    def decorator(f):
+      self.registrations.append(lambda app: app.register_error_handler(code, f))
+      return f
+    return decorator
+
+  def init_app(self, app):
+    for register in self.registrations:
+      register(app)
+
+views = Views()
+moment = Moment()
 
 #----------------------------------------------------------------------------#
 # Display form validation errors 
@@ -54,55 +82,129 @@ def flash_form_error_message(form):
     msg = f'{form[field].label.text}: {err_list}'
     flash(msg, FlashType.ERROR)
 
+#----------------------------------------------------------------------------#
+# Keyset pagination driven by the ?after= / ?before= cursors
+#----------------------------------------------------------------------------#
+def paginate(query, keys, **args):
+  return keyset_paginate(query, keys,
+                         after=request.args.get('after'),
+                         before=request.args.get('before'),
+                         args=args)
+
+def wants_json():
+  return request.args.get('format') == 'json'
+
+def genres_arg():
+  # ?genres= may repeat; unknown genres are ignored
+  valid = Genres.validation_set()
+  return [x for x in request.values.getlist('genres') if x in valid]
+
+def with_formatted_times(shows, format='full'):
+  # Adds each show's formatted start time, the whole list in one pass.
+  for show, formatted in zip(shows, format_many([x['start_time'] for x in shows], format)):
+    show['start_time_formatted'] = formatted
+  return shows
+
+def facets_json(counts):
+  return {
+    'genres': dict(counts['genres']),
+    'states': dict(counts['states']),
+  }
+
+#----------------------------------------------------------------------------#
+# Typeahead lookups
+#----------------------------------------------------------------------------#
+def lookup_response(model):
+  limit = request.args.get('limit', 10, type=int)
+  limit = max(1, min(limit, current_app.config.get('LOOKUP_LIMIT_MAX', 50)))
+  rows = lookup(model, request.args.get('q', ''), limit)
+  return jsonify({
+    'data': [{'id': x.id, 'name': x.name} for x in rows],
+  })
+
+#----------------------------------------------------------------------------#
+# Cached pages affected by writes to a venue or an artist
+#----------------------------------------------------------------------------#
+def venue_pages(venue_id):
+  pages = [('index', {}), ('venues', {}), ('show_venue', {'venue_id': venue_id})]
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  pages += [('show_artist', {'artist_id': x}) for (x,) in artist_ids]
+  return pages
+
+def artist_pages(artist_id):
+  pages = [('index', {}), ('show_artist', {'artist_id': artist_id})]
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  pages += [('show_venue', {'venue_id': x}) for (x,) in venue_ids]
+  return pages
+
+def evict_pages(pages):
+  for endpoint, view_args in pages:
+    page_cache.invalidate(endpoint, **view_args)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@views.route('/')
+@cache_policy.policy('page')
+@page_cache.cached
 def index():
-  venues = Venue.query.order_by(Venue.created_at.desc()).limit(10).all()
-  artists = Artist.query.order_by(Artist.created_at.desc()).limit(10).all()
+  # the two top-10 queries are independent: run them side by side
+  engine = read_engine()
+
+  def latest(model):
+    with engine.connect() as connection:
+      return connection.execute(
+        db.select(model.id, model.name).order_by(model.created_at.desc()).limit(10)
+      ).all()
+
+  venues, artists = run_concurrently(lambda: latest(Venue), lambda: latest(Artist))
   return render_template('pages/home.html', venues=venues, artists=artists)
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues/')
+@views.route('/venues/')
+@cache_policy.policy('listing')
+@page_cache.cached
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
+  # One query: every venue with its denormalized upcoming show count,
+  # ordered so that areas can be grouped in a single pass.
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                          Venue.upcoming_shows_count.label('num_upcoming_shows'))\
+                   .order_by(Venue.city, Venue.state, Venue.name).all()
 
   areas = []
-  cities = db.session.query(Venue.city, Venue.state).group_by(Venue.city, Venue.state)\
-                                                    .order_by(Venue.city).all()  
-  for city in cities:
-    area = {
-      'city': city[0],
-      'state': city[1],
+  for (city, state), group in groupby(rows, key=lambda x: (x.city, x.state)):
+    areas.append({
+      'city': city,
+      'state': state,
       'venues': [
             {
               'id': x.id,
               'name': x.name,
-              'num_upcoming_shows': x.num_upcoming_shows(),
+              'num_upcoming_shows': x.num_upcoming_shows,
             }
-            for x in Venue.query.filter(Venue.city == city[0], Venue.state == city[1])\
-                                .order_by(Venue.name).all()
+            for x in group
         ]
-    }
-    #print(area)
-    areas.append(area)
+    })
 
   return render_template('pages/venues.html', areas=areas)
 
-@app.route('/venues/search/', methods=['POST'])
+@views.route('/venues/search/', methods=['GET', 'POST'])
+@cache_policy.policy('listing')
 def search_venues():
 
-  search_term = request.form.get('search_term', '')
-  q = f'%{search_term}%'
-  venues = Venue.query.filter(Venue.name.ilike(q)).all()
+  search_term = request.values.get('search_term', '')
+  state = request.values.get('state', '')
+  genres = genres_arg()
+  query = search_query(Venue, name=search_term, state=state, genres=genres)
+  venues = paginate(query, sort_keys(Venue, search_term),
+                  search_term=search_term, state=state, genres=genres)
+  counts = facets(query, Venue)
 
   response = {
-       'count': len(venues),
+       'count': counts['total'],
        'data': [
             {
                'id': x.id,
@@ -114,72 +216,93 @@ def search_venues():
     }
 
   #print(response)
-  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+  if wants_json():
+    return jsonify({**response, 'facets': facets_json(counts), **venues.cursors()})
+  return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                         page=venues, facets=counts, genres=genres, state=state)
+
+#  Venue typeahead (show form)
+#  ----------------------------------------------------------------
+@views.route('/venues/lookup/')
+@cache_policy.policy('listing')
+def lookup_venues():
+  return lookup_response(Venue)
 
 #  Advanced venue search
 #  ----------------------------------------------------------------
-@app.route('/venues/search_adv', methods=['GET', 'POST'])
+@views.route('/venues/search_adv', methods=['GET', 'POST'])
+@cache_policy.policy('listing')
 def search_venues_advanced():
 
-  if request.method == 'GET':
+  if request.method == 'GET' and not request.args:
     form = SearchForm()
     return render_template('pages/search_venues_adv.html', results=None, form=form)
 
-  form = SearchForm(request.form)
+  form = SearchForm(request.values)
   name = form.data.get('name', '')
   city = form.data.get('city', '')
   state = form.data.get('state', '')
+  genres = genres_arg()
  
-  if state != '':
-    venues = Venue.query.filter(Venue.name.ilike(f'%{name}%'),
-                                Venue.city.ilike(f'%{city}%'),
-                                Venue.state == state).all()
-  else:
-    venues = Venue.query.filter(Venue.name.ilike(f'%{name}%'),
-                                Venue.city.ilike(f'%{city}%')).all()     
+  query = search_query(Venue, name=name, city=city, state=state, genres=genres)
+  venues = paginate(query, sort_keys(Venue, name),
+                  name=name, city=city, state=state, genres=genres)
+  counts = facets(query, Venue)
 
-  return render_template('pages/search_venues_adv.html', results=venues, form=form)
+  return render_template('pages/search_venues_adv.html', results=venues, page=venues,
+                         count=counts['total'], facets=counts, genres=genres, state=state,
+                         form=form)
 
 
-@app.route('/venues/<int:venue_id>/')
+@views.route('/venues/<int:venue_id>/')
+@cache_policy.policy('page')
+@page_cache.cached
 def show_venue(venue_id):
 
-  venue = db.session.get(Venue, venue_id)
-  if venue is None:
+  data = entity_cache.get(Venue, venue_id)
+  if data is None:
     abort(404)
 
-  data = venue.to_dict()
+  # One query: the venue's shows with the artist columns joined in and the
+  # past/upcoming split computed by the database.
+  upcoming = (Show.start_time > datetime.now(timezone.utc)).label('upcoming')
+  shows = db.session.query(Show.artist_id, Artist.name, Artist.image_link,
+                           Show.start_time, upcoming)\
+                    .join(Show.artist)\
+                    .filter(Show.venue_id == venue_id)\
+                    .order_by(Show.start_time).all()
 
   data['past_shows'] = []
   data['upcoming_shows'] = []
-
-  for show in venue.shows:
+  for show in shows:
     tmp_show = {
           'artist_id': show.artist_id,
-          'artist_name': show.artist.name,
-          'artist_image_link': show.artist.image_link,
-          'start_time': show.start_time.isoformat(),       
+          'artist_name': show.name,
+          'artist_image_link': show.image_link,
+          'start_time': show.start_time,
       }
-        
-    if show.start_time <= datetime.now(timezone.utc):
-      data['past_shows'].append(tmp_show)
+
+    if show.upcoming:
+      data['upcoming_shows'].append(tmp_show)
     else:
-      data['upcoming_shows'].append(tmp_show)     
+      data['past_shows'].append(tmp_show)
 
   data['past_shows_count'] = len(data['past_shows'])
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
+  with_formatted_times(data['upcoming_shows'] + data['past_shows'])
 
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create/', methods=['GET'])
+@views.route('/venues/create/', methods=['GET'])
+@cache_policy.policy('form')
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create/', methods=['POST'])
+@views.route('/venues/create/', methods=['POST'])
 def create_venue_submission():
   error = False
   form = VenueForm(request.form)
@@ -204,22 +327,24 @@ def create_venue_submission():
     flash(f'An error occurred. Venue {request.form["name"]} could not be listed.', FlashType.ERROR)
     abort(500)
   else:
+    evict_pages([('index', {}), ('venues', {})])
     flash(f'Venue {request.form["name"]} was successfully listed!', FlashType.INFO)
     return redirect(url_for('index'))
 
 
 #  Delete Venue via an http post request
 #  ----------------------------------------------------------------
-@app.route('/venues/<venue_id>/delete/', methods=['POST'])
+@views.route('/venues/<int:venue_id>/delete/', methods=['POST'])
 def delete_venue(venue_id):
   error = False
-  venue = db.session.get(Venue, venue_id)
+  venue = entity_cache.get(Venue, venue_id)
   if venue is None:
     abort(404)
 
+  id, name = venue['id'], venue['name']
+  pages = venue_pages(id)
   try:
-    db.session.delete(venue)
-    db.session.commit()
+    delete_entities(Venue, [id])
   except:
     error = True
     db.session.rollback()
@@ -228,26 +353,28 @@ def delete_venue(venue_id):
     db.session.close()
 
   if error:
-    flash(f'An error occurred. Venue {venue.name} could not be deleted.', FlashType.ERROR)
+    flash(f'An error occurred. Venue {name} could not be deleted.', FlashType.ERROR)
     abort(500)
   else:
-    flash(f'Venue {venue.name} was deleted!', FlashType.INFO)
+    evict_pages(pages)
+    flash(f'Venue {name} was deleted!', FlashType.INFO)
     return redirect(url_for('index'))
 
 #  Delete Venue via an http delete request (ajax) 
 #  ----------------------------------------------------------------
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@views.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue_json(venue_id):
   error = False
-  venue = db.session.get(Venue, venue_id)
+  venue = entity_cache.get(Venue, venue_id)
   if venue is None:
     return jsonify ({
       'error': 'Venue was not found.'
     }), 404
 
+  id, name = venue['id'], venue['name']
+  pages = venue_pages(id)
   try:
-    db.session.delete(venue)
-    db.session.commit()
+    delete_entities(Venue, [id])
   except:
     error = True
     db.session.rollback()
@@ -257,41 +384,84 @@ def delete_venue_json(venue_id):
 
   if error:
     return jsonify({
-      'error': f'Venue {venue.name} could not be deleted.'
+      'error': f'Venue {name} could not be deleted.'
     }), 500
   else:
+    evict_pages(pages)
     return jsonify({
       'venue': {
-        'id': venue.id,
-        'name': venue.name,
+        'id': id,
+        'name': name,
       }
     }), 201
 
+#  Bulk deletion (see deletion.py)
+#  ----------------------------------------------------------------
+@views.route('/<any(venues, artists, shows):entity>/bulk-delete/', methods=['POST'])
+def bulk_delete(entity):
+  # venues/artists: {"ids": [1, 2, 3]}; shows: {"before": "2020-01-01"}
+  data = request.get_json(silent=True) or {}
+  try:
+    if entity == 'shows':
+      before = day_start(date.fromisoformat(data['before']))
+    else:
+      ids = [int(x) for x in data['ids']]
+  except (KeyError, TypeError, ValueError):
+    return jsonify({
+      'error': 'Expected {"before": "YYYY-MM-DD"}' if entity == 'shows' else 'Expected {"ids": [...]}'
+    }), 400
+
+  try:
+    if entity == 'shows':
+      deleted = delete_past_shows(before)
+    else:
+      deleted = delete_entities(Venue if entity == 'venues' else Artist, ids)
+  except:
+    db.session.rollback()
+    print(sys.exc_info())
+    return jsonify({
+      'error': f'The {entity} could not all be deleted.'
+    }), 500
+  finally:
+    db.session.close()
+
+  page_cache.clear()
+  return jsonify({'deleted': deleted})
+
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists/')
+@views.route('/artists/')
+@cache_policy.policy('listing')
 def artists():
 
+  page = paginate(db.session.query(Artist.id, Artist.name), [Artist.name, Artist.id])
   data = [
         {
             'id': x.id,
             'name': x.name,
         }
-        for x in Artist.query.order_by(Artist.name).all()
+        for x in page
     ]
 
-  return render_template('pages/artists.html', artists=data)
+  if wants_json():
+    return jsonify({'artists': data, **page.cursors()})
+  return render_template('pages/artists.html', artists=data, page=page)
 
-@app.route('/artists/search/', methods=['POST'])
+@views.route('/artists/search/', methods=['GET', 'POST'])
+@cache_policy.policy('listing')
 def search_artists():
 
-  search_term = request.form.get('search_term', '')
-  q = f'%{search_term}%'
-  artists = Artist.query.filter(Artist.name.ilike(q)).all()
+  search_term = request.values.get('search_term', '')
+  state = request.values.get('state', '')
+  genres = genres_arg()
+  query = search_query(Artist, name=search_term, state=state, genres=genres)
+  artists = paginate(query, sort_keys(Artist, search_term),
+                  search_term=search_term, state=state, genres=genres)
+  counts = facets(query, Artist)
 
   response = {
-       'count': len(artists),
+       'count': counts['total'],
        'data': [
             {
                'id': x.id,
@@ -302,76 +472,125 @@ def search_artists():
          ],
     }
 
-  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+  if wants_json():
+    return jsonify({**response, 'facets': facets_json(counts), **artists.cursors()})
+  return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                         page=artists, facets=counts, genres=genres, state=state)
+
+#  Artist typeahead (show form)
+#  ----------------------------------------------------------------
+@views.route('/artists/lookup/')
+@cache_policy.policy('listing')
+def lookup_artists():
+  return lookup_response(Artist)
 
 #  Advanced artist search
 #  ----------------------------------------------------------------
-@app.route('/artists/search_adv', methods=['GET', 'POST'])
+@views.route('/artists/search_adv', methods=['GET', 'POST'])
+@cache_policy.policy('listing')
 def search_artists_advanced():
 
-  if request.method == 'GET':
+  if request.method == 'GET' and not request.args:
     form = SearchForm()
     return render_template('pages/search_artists_adv.html', results=None, form=form)
 
-  form = SearchForm(request.form)
+  form = SearchForm(request.values)
   name = form.data.get('name', '')
   city = form.data.get('city', '')
   state = form.data.get('state', '')
+  genres = genres_arg()
  
-  if state != '':
-    artists = Artist.query.filter(Artist.name.ilike(f'%{name}%'),
-                                 Artist.city.ilike(f'%{city}%'),
-                                 Artist.state == state).all()
-  else:
-    artists = Artist.query.filter(Artist.name.ilike(f'%{name}%'),
-                                 Artist.city.ilike(f'%{city}%')).all()     
-
+  query = search_query(Artist, name=name, city=city, state=state, genres=genres)
+  artists = paginate(query, sort_keys(Artist, name),
+                  name=name, city=city, state=state, genres=genres)
+  counts = facets(query, Artist)
 
-  return render_template('pages/search_artists_adv.html', results=artists, form=form)
+  return render_template('pages/search_artists_adv.html', results=artists, page=artists,
+                         count=counts['total'], facets=counts, genres=genres, state=state,
+                         form=form)
 
 
-@app.route('/artists/<int:artist_id>/')
+@views.route('/artists/<int:artist_id>/')
+@cache_policy.policy('page')
+@page_cache.cached
 def show_artist(artist_id):
 
-  artist = db.session.get(Artist, artist_id)
-  if artist is None:
+  data = entity_cache.get(Artist, artist_id)
+  if data is None:
     abort(404)
 
-  data = artist.to_dict()
+  # One query: the artist's shows with the venue columns joined in and the
+  # past/upcoming split computed by the database.
+  upcoming = (Show.start_time > datetime.now(timezone.utc)).label('upcoming')
+  shows = db.session.query(Show.venue_id, Venue.name, Venue.image_link,
+                           Show.start_time, upcoming)\
+                    .join(Show.venue)\
+                    .filter(Show.artist_id == artist_id)\
+                    .order_by(Show.start_time).all()
 
   data['past_shows'] = []
   data['upcoming_shows'] = []
-  for show in artist.shows:
+  for show in shows:
     tmp_show = {
           'venue_id': show.venue_id,
-          'venue_name': show.venue.name,
-          'venue_image_link': show.venue.image_link,
-          'start_time': show.start_time.isoformat(),        
+          'venue_name': show.name,
+          'venue_image_link': show.image_link,
+          'start_time': show.start_time,
       }
 
-    if show.start_time <= datetime.now(timezone.utc):
-      data['past_shows'].append(tmp_show)
-    else:
+    if show.upcoming:
       data['upcoming_shows'].append(tmp_show)
+    else:
+      data['past_shows'].append(tmp_show)
 
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
   data['past_shows_count'] = len(data['past_shows'])
+  with_formatted_times(data['upcoming_shows'] + data['past_shows'])
 
   return render_template('pages/show_artist.html', artist=data)
 
+#  Delete Artist
+#  ----------------------------------------------------------------
+@views.route('/artists/<int:artist_id>/delete/', methods=['POST'])
+def delete_artist(artist_id):
+  error = False
+  artist = entity_cache.get(Artist, artist_id)
+  if artist is None:
+    abort(404)
+
+  id, name = artist['id'], artist['name']
+  pages = artist_pages(id)
+  try:
+    delete_entities(Artist, [id])
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  finally:
+    db.session.close()
+
+  if error:
+    flash(f'An error occurred. Artist {name} could not be deleted.', FlashType.ERROR)
+    abort(500)
+  else:
+    evict_pages(pages)
+    flash(f'Artist {name} was deleted!', FlashType.INFO)
+    return redirect(url_for('index'))
+
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit/', methods=['GET'])
+@views.route('/artists/<int:artist_id>/edit/', methods=['GET'])
+@cache_policy.policy('form')
 def edit_artist(artist_id):
 
-  artist = db.session.get(Artist, artist_id)
+  artist = entity_cache.get(Artist, artist_id)
   if artist is None:
     abort(404)
   
-  form = ArtistForm(obj=artist)
+  form = ArtistForm(data=artist)
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit/', methods=['POST'])
+@views.route('/artists/<int:artist_id>/edit/', methods=['POST'])
 def edit_artist_submission(artist_id):
 
   error = False
@@ -385,6 +604,7 @@ def edit_artist_submission(artist_id):
     flash_form_error_message(form)
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
+  pages = artist_pages(artist_id)
   try:
     form.populate_obj(artist)
     db.session.add(artist)
@@ -400,22 +620,25 @@ def edit_artist_submission(artist_id):
     flash(f'An error occurred. Artist {request.form["name"]} could not be updated.', FlashType.ERROR)
     abort(500)    
   else:
+    entity_cache.discard(Artist, [artist_id])
+    evict_pages(pages)
     flash(f'Artist {request.form["name"]} was successfully updated!', FlashType.INFO)  
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit/', methods=['GET'])
+@views.route('/venues/<int:venue_id>/edit/', methods=['GET'])
+@cache_policy.policy('form')
 def edit_venue(venue_id):
 
-  venue = db.session.get(Venue, venue_id)
+  venue = entity_cache.get(Venue, venue_id)
   if venue is None:
     abort(404)
 
-  form = VenueForm(obj=venue)
+  form = VenueForm(data=venue)
 
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit/', methods=['POST'])
+@views.route('/venues/<int:venue_id>/edit/', methods=['POST'])
 def edit_venue_submission(venue_id):
 
   error = False
@@ -428,6 +651,7 @@ def edit_venue_submission(venue_id):
     flash_form_error_message(form)
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
+  pages = venue_pages(venue_id)
   try:
     form.populate_obj(venue)
     db.session.add(venue)
@@ -443,18 +667,21 @@ def edit_venue_submission(venue_id):
     flash(f'An error occured. Venue {request.form["name"]} could not be updated!', FlashType.ERROR)
     abort(500)
   else:
+    entity_cache.discard(Venue, [venue_id])
+    evict_pages(pages)
     flash(f'Venue {request.form["name"]} was successfully updated!', FlashType.INFO)
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create/', methods=['GET'])
+@views.route('/artists/create/', methods=['GET'])
+@cache_policy.policy('form')
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create/', methods=['POST'])
+@views.route('/artists/create/', methods=['POST'])
 def create_artist_submission():
 
     error = False
@@ -480,82 +707,254 @@ def create_artist_submission():
       flash('An error occurred. Artist {request.form["name"]} could not be listed.', FlashType.ERROR)
       abort(500)
     else:
+      evict_pages([('index', {})])
       flash(f'Artist {request.form["name"]} was successfully listed!', FlashType.INFO)
       return redirect(url_for('index'))
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows/')
+@views.route('/shows/')
+@cache_policy.policy('listing')
 def shows():
 
+  query = db.session.query(Show.venue_id, Venue.name.label('venue_name'),
+                           Show.artist_id, Artist.name.label('artist_name'),
+                           Artist.image_link.label('artist_image_link'),
+                           Show.start_time)\
+                    .join(Show.venue).join(Show.artist)
+  page = paginate(query, [Show.start_time, Show.id])
   data = [
         {
           'venue_id': x.venue_id,
-          'venue_name': x.venue.name,
+          'venue_name': x.venue_name,
           'artist_id': x.artist_id,
-          'artist_name': x.artist.name,
-          'artist_image_link': x.artist.image_link,
-          'start_time': x.start_time.isoformat()
+          'artist_name': x.artist_name,
+          'artist_image_link': x.artist_image_link,
+          'start_time': x.start_time
         }
-        for x in Show.query.order_by(Show.start_time).all()
+        for x in page
     ]
 
-  return render_template('pages/shows.html', shows=data)
+  if wants_json():
+    shows = [{**x, 'start_time': x['start_time'].isoformat()} for x in data]
+    return jsonify({'shows': shows, **page.cursors()})
+  return render_template('pages/shows.html', shows=with_formatted_times(data), page=page)
+
+
+#  Shows by date range
+#  ----------------------------------------------------------------
+@views.route('/shows/search/')
+@cache_policy.policy('listing')
+def search_shows():
+
+  if not request.args:
+    return render_template('pages/show.html', form=ShowSearchForm(), results=None)
+
+  form = ShowSearchForm(request.args)
+  if not form.validate():
+    if wants_json():
+      return jsonify({'errors': form.errors}), 400
+    flash_form_error_message(form)
+    return render_template('pages/show.html', form=form, results=None)
+
+  start = form.start.data or datetime.now(timezone.utc).date()
+  end = form.end.data or start + timedelta(days=current_app.config.get('SHOW_SEARCH_DAYS', 30))
+  city = form.city.data or ''
+  state = form.state.data or ''
+
+  query = shows_between(day_start(start), day_start(end + timedelta(days=1)), city, state)
+  page = paginate(query, [Show.start_time, Show.id],
+                  city=city, state=state, start=start.isoformat(), end=end.isoformat())
+  data = [
+        {
+          'id': x.id,
+          'start_time': x.start_time,
+          'venue_id': x.venue_id,
+          'venue_name': x.venue_name,
+          'venue_city': x.venue_city,
+          'venue_state': x.venue_state,
+          'artist_id': x.artist_id,
+          'artist_name': x.artist_name,
+          'artist_image_link': x.artist_image_link,
+        }
+        for x in page
+    ]
+
+  if wants_json():
+    shows = [{**x, 'start_time': x['start_time'].isoformat()} for x in data]
+    return jsonify({'shows': shows, 'from': start.isoformat(), 'to': end.isoformat(),
+                    **page.cursors()})
+  return render_template('pages/show.html', form=form, results=with_formatted_times(data), page=page,
+                         start=start, end=end)
+
+
+#  Venue calendar
+#  ----------------------------------------------------------------
+@views.route('/venues/<int:venue_id>/calendar/')
+@cache_policy.policy('listing')
+def venue_calendar(venue_id):
+
+  venue = entity_cache.get(Venue, venue_id)
+  if venue is None:
+    abort(404)
+
+  today = datetime.now(timezone.utc).date()
+  try:
+    year, month = map(int, request.args.get('month', f'{today.year}-{today.month}').split('-'))
+    first, following = month_bounds(year, month)
+  except ValueError:
+    abort(400)
+
+  weeks = venue_month(venue_id, year, month)
+
+  if wants_json():
+    return jsonify({
+      'venue_id': venue_id,
+      'month': f'{year:04d}-{month:02d}',
+      'days': [
+            {
+              'date': day.isoformat(),
+              'shows': [{'id': x.id, 'start_time': x.start_time.isoformat(),
+                         'artist_id': x.artist_id, 'artist_name': x.artist_name}
+                        for x in shows],
+            }
+            for week in weeks for day, shows in week
+            if shows and day.month == month
+        ],
+    })
+
+  previous = first - timedelta(days=1)
+  return render_template('pages/venue_calendar.html', venue=venue, weeks=weeks, month=first,
+                         previous=f'{previous.year:04d}-{previous.month:02d}',
+                         next=f'{following.year:04d}-{following.month:02d}',
+                         today=today)
 
 
 # Create Show
 # -----------------------------------------------------------
-@app.route('/shows/create/', methods=['GET'])
+@views.route('/shows/create/', methods=['GET'])
+@cache_policy.policy('form')
 def create_shows():
-  artists = Artist.query.all()
-  venues = Venue.query.all()
-  form = ShowForm(artists=artists, venues=venues)
+  form = ShowForm()
 
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create/', methods=['POST'])
+@views.route('/shows/create/', methods=['POST'])
 def create_show_submission():
 
-  error = False
-  artists = Artist.query.all()
-  venues = Venue.query.all()
-  form = ShowForm(request.form, artists=artists, venues=venues)
+  form = ShowForm(request.form)
 
   if not form.validate():
     flash_form_error_message(form)
     return render_template('forms/new_show.html', form=form)
 
+  venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+  duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
+  slots = weekly_slots(form.start_time.data, duration, form.weeks.data or 1)
   try:
-    show = Show()
-    form.populate_obj(show)
-    db.session.add(show)
-    db.session.commit()
+    listed = book(venue_id, artist_id, slots)
+  except Conflict as e:
+    db.session.rollback()
+    if not e.shows:
+      flash('Another show was just listed at that time. Please pick another time.', FlashType.ERROR)
+    for show in e.shows:
+      booked = show.venue_name if show.venue_id == venue_id else show.artist_name
+      flash(f'{booked} is already booked from '
+            f'{format_datetime(show.start_time, "full")} to {format_datetime(show.end_time, "full")}.',
+            FlashType.ERROR)
+    return render_template('forms/new_show.html', form=form)
   except:
-    error = True
     db.session.rollback()
     print(sys.exc_info())
+    flash('An error occured. The new show could not be listed!', FlashType.ERROR)
+    abort(500)
   finally:
     db.session.close()
 
-  if error:
-    flash('An error occured. The new show could not be listed!', FlashType.ERROR)
-    abort(500)
-  else:
-    flash('Show was successfully listed!', FlashType.INFO)
-    return redirect(url_for('index'))
+  evict_pages([('show_venue', {'venue_id': venue_id}),
+               ('show_artist', {'artist_id': artist_id})])
+  flash('Show was successfully listed!' if listed == 1 else f'{listed} shows were successfully listed!',
+        FlashType.INFO)
+  return redirect(url_for('index'))
+
+
+#  Streaming export
+#  ----------------------------------------------------------------
+def datetime_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+
+@views.route('/export/<any(shows, venues, artists):entity>.<any(csv, ndjson):format>')
+def export_rows(entity, format):
+  rows = export(entity, format,
+                start=datetime_arg('from'),
+                end=datetime_arg('to'),
+                updated_since=datetime_arg('updated_since'))
+  return Response(stream_with_context(rows),
+                  mimetype=EXPORT_FORMATS[format],
+                  headers={'Content-Disposition': f'attachment; filename={entity}.{format}'})
+
+
+#  Page cache statistics
+#  ----------------------------------------------------------------
+@views.route('/cache/stats/')
+def cache_stats():
+  return jsonify(page_cache.stats())
 
 
-@app.errorhandler(404)
+@views.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@views.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+#----------------------------------------------------------------------------#
+# App factory.
+#----------------------------------------------------------------------------#
+
+# every app built in this process, for dispose_engines()
+apps = weakref.WeakSet()
+
+def create_app(config=None):
+  # Settings come from config.py, then FLASK_* environment variables
+  # (FLASK_PAGE_SIZE=100, values parsed as JSON), then `config`.
+  app = Flask(__name__)
+  app.config.from_object('config')
+  app.config.from_prefixed_env()
+  if config:
+    app.config.update(config)
+  if not app.config.get('SECRET_KEY'):
+    app.config['SECRET_KEY'] = instance_secret_key(app)
+  if app.config.get('TEMPLATE_BYTECODE_CACHE'):
+    init_bytecode_cache(app)
+
+  moment.init_app(app)
+  db.init_app(app)
+  init_migrate(app)
+  for command in (counters_cli, search_cli, import_command, export_command,
+                  explain_command, assets_cli, delete_cli):
+    app.cli.add_command(command)
+  page_cache.init_app(app)
+  entity_cache.init_app(app)
+  counter_roll_over.init_app(app)
+  metrics.init_app(app)
+  assets.init_app(app)
+  cache_policy.init_app(app)
+  compression.init_app(app)
+  app.register_blueprint(api)
+  app.jinja_env.filters['datetime'] = format_datetime
+  views.init_app(app)
+
+  if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -565,17 +964,63 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+  if app.config.get('WARMUP'):
+    warm_up(app)
+
+  apps.add(app)
+  return app
+
+def init_migrate(app):
+  # Flask-Migrate (and alembic) only serve `flask db ...`: outside of the
+  # flask command, web workers do without the import.
+  if click.get_current_context(silent=True) is None:
+    return
+  from flask_migrate import Migrate
+  Migrate(app, db)
+
+def instance_secret_key(app):
+  # Without SECRET_KEY, a key generated once and kept in the instance
+  # folder: shared by every worker of this node and stable across
+  # restarts. Several nodes must share one SECRET_KEY from the environment.
+  path = os.path.join(app.instance_path, 'secret_key')
+  if not os.path.exists(path):
+    os.makedirs(app.instance_path, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}'
+    with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+      f.write(os.urandom(32).hex())
+    try:
+      # atomic: the first worker to get there wins, the others read its key
+      os.link(temporary, path)
+    except FileExistsError:
+      pass
+    finally:
+      os.remove(temporary)
+    app.logger.warning('SECRET_KEY is not set: using the key stored in %s', path)
+  with open(path) as f:
+    return f.read().strip()
+
+def dispose_engines():
+  # With gunicorn --preload the app is built once and forked into the
+  # workers: each child drops the pooled connections inherited from the
+  # parent, without closing them since they still belong to the parent.
+  for app in list(apps):
+    with app.app_context():
+      for engine in db.engines.values():
+        engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=dispose_engines)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import gzip
+import shutil
+import hashlib
+import mimetypes
+import click
+from flask import current_app, request, url_for, send_from_directory, abort
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+#   flask assets build    bundle, fingerprint and precompress into static/dist
+#   flask assets clean    remove files of static/dist not in the manifest
+#
+# The stylesheets and scripts used by layouts/main.html are concatenated
+# into a few bundles (CSS is also minified), written to static/dist under a
+# name carrying a hash of their content, next to .gz (and, when the brotli
+# module is installed, .br) copies. static/dist/manifest.json maps bundle
+# names to those files; templates ask for {{ assets('main.css') }}.
+#
+# /static/dist/ answers with the precompressed copy the client accepts and
+# a year-long immutable Cache-Control: a changed asset gets a new name, so
+# repeat page loads never revalidate. Without a manifest (development),
+# assets() lists the source files, served as before.
+#
+# Files of earlier builds are kept, so pages rendered by workers still on
+# the previous release find their assets during a rolling deploy.
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'main.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+    'jquery.js': ['js/libs/jquery-1.11.1.min.js'],
+    'respond.js': ['js/libs/respond-1.4.2.min.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+
+# only these are worth compressing; images and woff fonts already are
+COMPRESSIBLE = {'.css', '.js', '.svg', '.eot', '.ttf', '.otf', '.json'}
+# below this, compression saves less than the headers it adds
+MIN_COMPRESS_SIZE = 256
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_TOKEN = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''  # strings, kept
+                       r'''|/\*(?!!).*?\*/'''                        # comments, not /*! */
+                       r'''|\s*;\s*(?=\})'''                          # last semicolon
+                       r'''|\s*([{};,>])\s*'''                        # space around punctuation
+                       r'''|\s+''', re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def minify_css(text):
+    # Conservative: drops comments and whitespace that cannot matter, leaves
+    # strings alone, and never touches ':' (`a :hover` != `a:hover`).
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return match.group(2)
+        token = match.group(0)
+        return ' ' if token.isspace() else ''
+
+    return CSS_TOKEN.sub(replace, text).strip()
+
+
+def fingerprint(name, content):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+class Builder:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist = os.path.join(static_folder, DIST)
+        self.written = set()
+
+    def write(self, name, content):
+        # Writes content under its fingerprinted name, with compressed
+        # copies; returns the name.
+        filename = fingerprint(name, content)
+        path = os.path.join(self.dist, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(content)
+        self.written.add(filename)
+
+        if os.path.splitext(name)[1] in COMPRESSIBLE and len(content) >= MIN_COMPRESS_SIZE:
+            variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(content, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(content):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    self.written.add(filename + suffix)
+        return filename
+
+    def rewrite_urls(self, source, text):
+        # url() references are relative to the source stylesheet: point them
+        # at fingerprinted copies, or at the original file when it is missing.
+        base = os.path.dirname(os.path.join(self.static_folder, source))
+
+        def replace(match):
+            target = match.group(2).strip()
+            if re.match(r'^([a-z]+:|/|#)', target):
+                return match.group(0)
+            path, sep, rest = re.match(r'([^?#]*)([?#]?)(.*)', target).groups()
+            path = os.path.normpath(os.path.join(base, path))
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    url = self.write(os.path.basename(path), f.read())
+            else:
+                url = os.path.relpath(path, self.dist).replace(os.sep, '/')
+            return f'url("{url}{sep}{rest}")'
+
+        return CSS_URL.sub(replace, text)
+
+    def bundle(self, name, sources):
+        parts = []
+        for source in sources:
+            with open(os.path.join(self.static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            if name.endswith('.css'):
+                parts.append(minify_css(self.rewrite_urls(source, text)))
+            else:
+                # the libraries come minified; ';' guards against a file
+                # ending without one
+                parts.append(text.rstrip() + '\n;')
+        return self.write(name, '\n'.join(parts).encode('utf-8'))
+
+    def build(self, bundles):
+        os.makedirs(self.dist, exist_ok=True)
+        manifest = {name: self.bundle(name, sources) for name, sources in bundles.items()}
+        with open(os.path.join(self.dist, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return manifest
+
+
+class Assets:
+    # Each app keeps its manifest in app.extensions['assets'].
+    def init_app(self, app):
+        self.load(app)
+        app.jinja_env.globals['assets'] = self.urls
+        app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'dist', self.send)
+
+    def load(self, app):
+        path = os.path.join(app.static_folder, DIST, MANIFEST)
+        try:
+            with open(path) as f:
+                app.extensions['assets'] = json.load(f)
+        except FileNotFoundError:
+            app.extensions['assets'] = {}
+
+    def urls(self, name):
+        # URLs to include for a bundle: the built file, or its sources.
+        manifest = current_app.extensions['assets']
+        if name in manifest:
+            return [url_for('dist', filename=manifest[name])]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def send(self, filename):
+        directory = os.path.join(current_app.static_folder, DIST)
+        if filename == MANIFEST:
+            abort(404)
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and \
+                    os.path.isfile(os.path.join(directory, filename + suffix)):
+                response = send_from_directory(directory, filename + suffix, max_age=MAX_AGE,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, max_age=MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
+assets_cli = AppGroup('assets')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, fingerprint and precompress the static assets."""
+    manifest = Builder(current_app.static_folder).build(BUNDLES)
+    assets.load(current_app)
+    for name, filename in sorted(manifest.items()):
+        click.echo(f'{name} -> {DIST}/{filename}')
+    if brotli is None:
+        click.echo('brotli is not installed: only gzip copies were written.')
+
+
+@assets_cli.command('clean')
+def clean_command():
+    """Remove built assets not referenced by the current manifest."""
+    dist = os.path.join(current_app.static_folder, DIST)
+    if not os.path.isdir(dist):
+        return
+    builder = Builder(current_app.static_folder)
+    builder.build(BUNDLES)
+    keep = builder.written | {MANIFEST}
+    removed = 0
+    for filename in os.listdir(dist):
+        if filename not in keep:
+            path = os.path.join(dist, filename)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            removed += 1
+    click.echo(f'{removed} file(s) removed.')
@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------------#
+# The `datetime` template filter: the original string round-trip
+# (isoformat -> dateutil -> babel.dates.format_datetime) against datefmt.
+#
+#   python benchmarks/bench_datefmt.py [--shows 500] [--distinct 100]
+#
+# --distinct is the number of different start times among the shows; a
+# venue page typically repeats the same evening slots.
+#----------------------------------------------------------------------------#
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from timeit import repeat
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datefmt
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--distinct', type=int, default=100)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    slots = [now + timedelta(days=rnd.randint(-365, 365), hours=rnd.randint(0, 23))
+             for _ in range(args.distinct)]
+    values = [rnd.choice(slots) for _ in range(args.shows)]
+    strings = [x.isoformat() for x in values]
+
+    expected = [legacy_format_datetime(x, 'full') for x in strings]
+    assert [datefmt.format_datetime(x, 'full') for x in values] == expected
+    assert datefmt.format_many(values, 'full') == expected
+
+    cases = {
+        'legacy (str round-trip)': lambda: [legacy_format_datetime(x, 'full') for x in strings],
+        'datefmt, cold cache': lambda: (datefmt._format.cache_clear(),
+                                        [datefmt.format_datetime(x, 'full') for x in values]),
+        'datefmt, warm cache': lambda: [datefmt.format_datetime(x, 'full') for x in values],
+        'datefmt.format_many, cold': lambda: (datefmt._format.cache_clear(),
+                                              datefmt.format_many(values, 'full')),
+    }
+
+    print(f'{args.shows} shows, {args.distinct} distinct start times')
+    for name, case in cases.items():
+        best = min(repeat(case, number=args.number, repeat=5)) / args.number
+        print(f'{name:<28} {best * 1000:8.3f} ms per list  {best / args.shows * 1e6:7.2f} us per show')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#----------------------------------------------------------------------------#
+# WSGI entry point used by bench_load.py: the regular app on the benchmark
+# database, with an artificial per-statement delay standing in for a slow
+# database server. BENCH_GEVENT=1 loads it through wsgi_gevent.
+#----------------------------------------------------------------------------#
+import os
+import time
+import config
+
+config.SQLALCHEMY_DATABASE_URI = os.environ['BENCH_DATABASE_URL']
+config.PAGE_CACHE_ENABLED = False
+
+if os.environ.get('BENCH_GEVENT'):
+    from wsgi_gevent import app
+else:
+    from app import create_app
+    app = create_app()
+
+from sqlalchemy import event
+from models import db
+
+latency = float(os.environ.get('BENCH_DB_LATENCY', '0'))
+
+if latency:
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def slow_database(*args):
+            time.sleep(latency)
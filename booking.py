@@ -0,0 +1,125 @@
+from datetime import timedelta
+from sqlalchemy import insert, select, union, values, column, and_, Integer, DateTime
+from sqlalchemy.exc import IntegrityError
+from models import Venue, Artist, Show, db
+from counters import apply_show_deltas
+
+#----------------------------------------------------------------------------#
+# Double-booking detection and recurring show series.
+#
+# A show occupies [start_time, end_time) of its venue and of its artist. A
+# new slot conflicts with every show of the same venue or artist with
+#
+#   start_time < slot end  AND  end_time > slot start
+#
+# Shows last at most MAX_DURATION, so only shows starting after
+# slot start - MAX_DURATION can overlap: that lower bound turns the check
+# into range scans of ix_Show_venue_id_start_time and
+# ix_Show_artist_id_start_time. All the slots of a request (a weekly
+# series, an import batch) are checked with one query, joined against a
+# VALUES list of the slots.
+#
+# On PostgreSQL the exclusion constraints of Show (see models.py) enforce
+# the same rule in the database, so two concurrent bookings of the same
+# slot cannot both commit; the loser's IntegrityError becomes a Conflict.
+#----------------------------------------------------------------------------#
+
+MAX_DURATION = timedelta(hours=24)
+
+# SQLSTATE of exclusion_violation
+EXCLUSION_VIOLATION = '23P01'
+
+
+class Conflict(Exception):
+    def __init__(self, shows):
+        super().__init__(f'{len(shows)} conflicting show(s)')
+        # rows of conflicts(); empty when the database caught a race
+        self.shows = shows
+
+
+def weekly_slots(start_time, duration, weeks=1):
+    # [(start, end)] of a show repeated on the same weekday and time
+    return [(start_time + timedelta(weeks=i), start_time + timedelta(weeks=i) + duration)
+            for i in range(weeks)]
+
+
+def conflicts(slots):
+    # slots: [(venue_id, artist_id, start_time, end_time)]. Returns the
+    # booked shows overlapping any of them, with the index of the slot.
+    if not slots:
+        return []
+    slot_table = values(
+        column('slot', Integer),
+        column('venue_id', Integer),
+        column('artist_id', Integer),
+        column('slot_start', DateTime(timezone=True)),
+        column('slot_end', DateTime(timezone=True)),
+        column('earliest', DateTime(timezone=True)),
+        name='slots',
+    ).data([(i, venue_id, artist_id, start, end, start - MAX_DURATION)
+            for i, (venue_id, artist_id, start, end) in enumerate(slots)])
+    s = slot_table.c
+    # one branch per foreign key, each a range scan of its index (an OR of
+    # the two would only use the leading column)
+    overlapping_shows = union(*(
+        select(s.slot, Show.id.label('show_id'))
+        .select_from(slot_table)
+        .join(Show, and_(key == s[key.name],
+                         Show.start_time > s.earliest,
+                         Show.start_time < s.slot_end,
+                         Show.end_time > s.slot_start))
+        for key in (Show.venue_id, Show.artist_id)
+    )).subquery()
+    return db.session.query(overlapping_shows.c.slot, Show.id, Show.venue_id,
+                            Venue.name.label('venue_name'), Show.artist_id,
+                            Artist.name.label('artist_name'), Show.start_time, Show.end_time)\
+        .join(Show, Show.id == overlapping_shows.c.show_id)\
+        .join(Venue, Venue.id == Show.venue_id)\
+        .join(Artist, Artist.id == Show.artist_id)\
+        .order_by(overlapping_shows.c.slot, Show.start_time)\
+        .all()
+
+
+def overlapping(slots):
+    # Indexes of the slots overlapping an earlier slot of the same list
+    # (same venue or artist), e.g. within an import batch.
+    clashes = set()
+    for key in (0, 1):
+        order = sorted((i for i, slot in enumerate(slots) if slot[key] is not None),
+                       key=lambda i: (slots[i][key], slots[i][2]))
+        busy_until = {}
+        for i in order:
+            owner, start, end = slots[i][key], slots[i][2], slots[i][3]
+            if owner in busy_until and start < busy_until[owner]:
+                clashes.add(i)
+            else:
+                busy_until[owner] = end
+    return clashes
+
+
+def is_exclusion_violation(error):
+    return getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def book(venue_id, artist_id, slots):
+    # Lists one show per (start, end) slot in one transaction, or none of
+    # them: raises Conflict with the shows in the way.
+    rows = [(venue_id, artist_id, start, end) for start, end in slots]
+    found = conflicts(rows)
+    if found:
+        raise Conflict(found)
+    try:
+        shows = [{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start, 'end_time': end}
+                 for start, end in slots]
+        connection = db.session.connection()
+        # the bulk insert bypasses the counter events; this also sets the
+        # rows' counted_upcoming
+        apply_show_deltas(connection, shows)
+        connection.execute(insert(Show.__table__), shows)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_exclusion_violation(e):
+            raise Conflict([])
+        raise
+    return len(rows)
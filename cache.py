@@ -0,0 +1,375 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+from time import monotonic, sleep
+from flask import request, session, make_response, current_app
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+
+try:
+    import redis
+except ImportError:  # only needed for a redis:// ENTITY_CACHE_URL
+    redis = None
+
+#----------------------------------------------------------------------------#
+# Rendered page cache.
+#
+# A bounded LRU of rendered output keyed by (endpoint, view args, query
+# string). Read-mostly views are wrapped with @page_cache.cached and the
+# write routes evict exactly the pages they affect with
+# page_cache.invalidate(endpoint, **view_args). Entries also expire after
+# PAGE_CACHE_TTL seconds, since show pages change as shows become past.
+#
+# The cache lives in the worker process: invalidations do not reach other
+# workers, which serve their copy until the TTL runs out.
+#
+# page_cache (and entity_cache below) is a module-level handle: each app
+# keeps its own cache in app.extensions, and calls go to current_app's.
+#----------------------------------------------------------------------------#
+
+class LRUCache:
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires = monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, match):
+        # Removes every key for which match(key) is true.
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class PageStore(LRUCache):
+    # The page cache of one app.
+    def __init__(self, maxsize=512, ttl=None, enabled=True):
+        super().__init__(maxsize, ttl)
+        self.enabled = enabled
+
+    @staticmethod
+    def _key(endpoint, view_args, query_string=b''):
+        return (endpoint, tuple(sorted(view_args.items())), query_string)
+
+    def invalidate(self, endpoint, **view_args):
+        # Evicts every cached variant (query strings) of endpoint, optionally
+        # narrowed down to the given view arguments.
+        wanted = set(view_args.items())
+        self.delete(lambda key: key[0] == endpoint and wanted.issubset(key[1]))
+
+
+class PageCache:
+    def init_app(self, app):
+        app.extensions['page_cache'] = PageStore(
+            app.config.get('PAGE_CACHE_SIZE', 512),
+            app.config.get('PAGE_CACHE_TTL'),
+            app.config.get('PAGE_CACHE_ENABLED', True),
+        )
+
+    @staticmethod
+    def store():
+        return current_app.extensions['page_cache']
+
+    def cached(self, view):
+        # Caches 200 responses of a GET view. Requests carrying flashed
+        # messages bypass the cache, since those render into the page.
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = self.store()
+            if not store.enabled or request.method != 'GET' \
+                    or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = store._key(request.endpoint, request.view_args or {}, request.query_string)
+            entry = store.get(key)
+            if entry is not None:
+                body, status, headers = entry
+                return make_response(body, status, headers)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                store.set(key, (response.get_data(), response.status_code,
+                                [(k, v) for k, v in response.headers if k.lower() != 'set-cookie']))
+            return response
+        return wrapper
+
+    def invalidate(self, endpoint, **view_args):
+        self.store().invalidate(endpoint, **view_args)
+
+    def clear(self):
+        self.store().clear()
+
+    def stats(self):
+        return self.store().stats()
+
+
+page_cache = PageCache()
+
+
+#----------------------------------------------------------------------------#
+# Entity cache.
+#
+# Read-through cache of Venue and Artist to_dict() snapshots, keyed by
+# model and id: entity_cache.get(Venue, 12) returns a fresh dict (or None
+# for an unknown id) and loads the row only on a miss. Snapshots are kept
+# serialized, in a bounded LRU of the worker process and, with
+# ENTITY_CACHE_URL, in a backend shared by all workers and nodes (redis://,
+# or memory:// for a per-process stand-in in tests). Both expire after
+# ENTITY_CACHE_TTL seconds.
+#
+# Writes evict with entity_cache.discard(model, ids): locally and from the
+# shared backend; other workers' local copies live until the TTL, like
+# their cached pages. The show counters of a snapshot may lag by as much.
+#
+# A cold key is loaded once: concurrent misses in a process wait for the
+# first one, and with a shared backend the other processes wait (up to
+# ENTITY_CACHE_LOCK_TIMEOUT seconds) for the process holding its lock key.
+# Rows are read from the primary, so no replica lag gets cached.
+#----------------------------------------------------------------------------#
+
+class TagDateTime(JSONTag):
+    # ISO 8601, keeping microseconds and time zones (Flask's own tag uses
+    # HTTP dates)
+    key = ' dt'
+
+    def check(self, value):
+        return isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.fromisoformat(value)
+
+
+class MemoryBackend:
+    # The shared backend's interface, inside the process.
+    def __init__(self):
+        self.entries = {}
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires = self.entries.get(key, (None, None))
+            if expires is not None and expires <= monotonic():
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, monotonic() + ttl)
+
+    def add(self, key, value, ttl):
+        # set unless present; True when set
+        with self.lock:
+            _, expires = self.entries.get(key, (None, None))
+            if expires is not None and expires > monotonic():
+                return False
+            self.entries[key] = (value, monotonic() + ttl)
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+class RedisBackend:
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError(f'ENTITY_CACHE_URL={url} needs the redis module.')
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(key, value, ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+
+def shared_backend(url):
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    return RedisBackend(url)
+
+
+class EntityStore(LRUCache):
+    # The entity cache of one app.
+    prefix = 'fyyur:entity:'
+
+    def __init__(self, maxsize=2048, ttl=60, enabled=True, lock_timeout=2.0, backend=None):
+        super().__init__(maxsize, ttl)
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+        self.backend = backend
+        self.serializer = TaggedJSONSerializer()
+        self.serializer.register(TagDateTime, index=0)
+        self.loading = {}
+        self.loading_lock = Lock()
+        # bumped by discard(): a snapshot loaded across a discard is not kept
+        self.generation = 0
+
+    def _key(self, model, id):
+        return f'{self.prefix}{model.__tablename__}:{id}'
+
+    def get(self, model, id):
+        if not self.enabled:
+            return self._load(model, id)
+        key = self._key(model, id)
+        snapshot = super().get(key)
+        if snapshot is None:
+            snapshot = self._fill(key, model, id)
+        return self.serializer.loads(snapshot) if snapshot else None
+
+    def discard(self, model, ids):
+        keys = [self._key(model, id) for id in ids]
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(*keys)
+
+    @contextmanager
+    def _single_flight(self, key):
+        # one loader per key in this process; the others wait for it
+        with self.loading_lock:
+            lock, waiting = self.loading.get(key, (None, 0))
+            lock = lock or Lock()
+            self.loading[key] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.loading_lock:
+                lock, waiting = self.loading[key]
+                if waiting == 1:
+                    del self.loading[key]
+                else:
+                    self.loading[key] = (lock, waiting - 1)
+
+    def _fill(self, key, model, id):
+        # Returns the serialized snapshot, '' for a missing row.
+        with self._single_flight(key):
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > monotonic()):
+                return entry[0]
+
+            generation = self.generation
+            snapshot = self.backend.get(key) if self.backend is not None else None
+            if snapshot is None:
+                snapshot = self._fill_shared(key, model, id) if self.backend is not None \
+                    else self._serialized(model, id)
+            if snapshot and generation == self.generation:
+                self.set(key, snapshot)
+            return snapshot
+
+    def _fill_shared(self, key, model, id):
+        # one loader per key across processes: the holder of the lock key
+        # loads, the others poll for its result
+        lock_key = f'{key}:lock'
+        if not self.backend.add(lock_key, '1', self.lock_timeout):
+            deadline = monotonic() + self.lock_timeout
+            while monotonic() < deadline:
+                sleep(0.02)
+                snapshot = self.backend.get(key)
+                if snapshot is not None:
+                    return snapshot
+            return self._serialized(model, id)
+        try:
+            generation = self.generation
+            snapshot = self._serialized(model, id)
+            if snapshot and generation == self.generation:
+                self.backend.set(key, snapshot, self.ttl)
+            return snapshot
+        finally:
+            self.backend.delete(lock_key)
+
+    def _serialized(self, model, id):
+        data = self._load(model, id)
+        return self.serializer.dumps(data) if data is not None else ''
+
+    @staticmethod
+    def _load(model, id):
+        from models import db
+        row = db.session.get(model, id, bind_arguments={'bind': db.engine})
+        return row.to_dict() if row is not None else None
+
+
+class EntityCache:
+    def init_app(self, app):
+        app.extensions['entity_cache'] = EntityStore(
+            app.config.get('ENTITY_CACHE_SIZE', 2048),
+            app.config.get('ENTITY_CACHE_TTL', 60),
+            app.config.get('ENTITY_CACHE_ENABLED', True),
+            app.config.get('ENTITY_CACHE_LOCK_TIMEOUT', 2.0),
+            shared_backend(app.config.get('ENTITY_CACHE_URL')),
+        )
+
+    @staticmethod
+    def store():
+        return current_app.extensions['entity_cache']
+
+    def get(self, model, id):
+        return self.store().get(model, id)
+
+    def discard(self, model, ids):
+        self.store().discard(model, ids)
+
+    def stats(self):
+        return self.store().stats()
+
+
+entity_cache = EntityCache()
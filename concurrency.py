@@ -0,0 +1,28 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+#----------------------------------------------------------------------------#
+# Running independent queries side by side.
+#
+# Each callable must use its own connection (not the request's scoped
+# session). In the sync server the calls run on a small thread pool; under
+# the gevent server (wsgi_gevent.py) threading is monkey-patched, so the same
+# pool hands out greenlets and database waits yield to other requests.
+# Calls run in a copy of the caller's context, so their statements are
+# counted against the request (metrics.py).
+#----------------------------------------------------------------------------#
+
+def _new_executor():
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='fyyur-query')
+
+
+_new_executor()
+# a forked worker inherits the pool but none of its threads
+os.register_at_fork(after_in_child=_new_executor)
+
+
+def run_concurrently(*calls):
+    futures = [_executor.submit(copy_context().run, call) for call in calls]
+    return [future.result() for future in futures]
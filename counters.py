@@ -0,0 +1,261 @@
+from collections import Counter
+from datetime import datetime, timezone
+from threading import Lock
+from time import monotonic
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, select, update, func, or_, inspect, bindparam
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Denormalized show counters on Venue and Artist.
+#
+# Venue/Artist.upcoming_shows_count and past_shows_count are adjusted in the
+# same transaction whenever a show is inserted, deleted or moved. Every show
+# records the counter it is counted in (Show.counted_upcoming): deleting or
+# moving it takes it out of that one, whatever the time is now.
+#
+# Shows become past by time passing: roll_over_counters() moves those still
+# counted as upcoming whose start time has passed. counter_roll_over runs it
+# before a request at most every COUNTERS_ROLL_OVER_SECONDS per worker, so
+# the listings lag by that much at most; `flask counters roll-over` does the
+# same from cron. `flask counters reconcile` recomputes every counter.
+#----------------------------------------------------------------------------#
+
+PARENTS = (
+    (Venue, 'venue_id'),
+    (Artist, 'artist_id'),
+)
+
+
+def _is_upcoming(start_time, now):
+    if start_time is None:
+        return False
+    if start_time.tzinfo is None:
+        start_time = start_time.astimezone()
+    return start_time > now
+
+
+def _bump(connection, venue_id, artist_id, upcoming, delta):
+    column = 'upcoming_shows_count' if upcoming else 'past_shows_count'
+
+    for model, parent_id in ((Venue, venue_id), (Artist, artist_id)):
+        if parent_id is None:
+            continue
+        table = model.__table__
+        connection.execute(
+            update(table)
+            .where(table.c.id == parent_id)
+            .values({column: table.c[column] + delta})
+        )
+
+
+@event.listens_for(Show, 'before_insert')
+def _show_inserting(mapper, connection, target):
+    target.counted_upcoming = _is_upcoming(target.start_time, datetime.now(timezone.utc))
+
+
+@event.listens_for(Show, 'after_insert')
+def _show_inserted(mapper, connection, target):
+    _bump(connection, target.venue_id, target.artist_id, target.counted_upcoming, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def _show_deleted(mapper, connection, target):
+    _bump(connection, target.venue_id, target.artist_id, target.counted_upcoming, -1)
+
+
+@event.listens_for(Show, 'before_update')
+def _show_updating(mapper, connection, target):
+    state = inspect(target)
+    old = {}
+    changed = False
+    for attr in ('venue_id', 'artist_id', 'start_time', 'counted_upcoming'):
+        history = state.attrs[attr].history
+        if history.has_changes():
+            changed = changed or attr != 'counted_upcoming'
+            old[attr] = history.deleted[0] if history.deleted else None
+        else:
+            old[attr] = getattr(target, attr)
+
+    if changed:
+        target.counted_upcoming = _is_upcoming(target.start_time, datetime.now(timezone.utc))
+        _bump(connection, old['venue_id'], old['artist_id'], old['counted_upcoming'], -1)
+        _bump(connection, target.venue_id, target.artist_id, target.counted_upcoming, 1)
+
+
+def apply_show_deltas(connection, rows, sign=1):
+    # Set-based counterpart of the mapper events for bulk writes that bypass
+    # the ORM: `rows` are the shows' column dicts. Rows being inserted
+    # (sign=1) get their counted_upcoming here: call it before the INSERT.
+    now = datetime.now(timezone.utc)
+    deltas = {Venue: {}, Artist: {}}
+    for row in rows:
+        if sign > 0:
+            row['counted_upcoming'] = _is_upcoming(row['start_time'], now)
+        position = 0 if row['counted_upcoming'] else 1
+        for model, parent_id in ((Venue, row['venue_id']), (Artist, row['artist_id'])):
+            if parent_id is None:
+                continue
+            delta = deltas[model].setdefault(parent_id, [0, 0])
+            delta[position] += sign
+
+    for model, by_parent in deltas.items():
+        if not by_parent:
+            continue
+        table = model.__table__
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam('parent_id'))
+            .values(upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming'),
+                    past_shows_count=table.c.past_shows_count + bindparam('past')),
+            [{'parent_id': parent_id, 'upcoming': upcoming, 'past': past}
+             for parent_id, (upcoming, past) in by_parent.items()]
+        )
+
+
+def remove_show_counts(connection, condition, parents=PARENTS):
+    # Set-based counterpart of apply_show_deltas(sign=-1) for the shows
+    # matching `condition`, about to be deleted without the ORM: one grouped
+    # UPDATE per parent table, however many shows there are.
+    for model, fk in parents:
+        show_fk = getattr(Show, fk)
+        counts = select(show_fk.label('parent_id'),
+                        func.count().label('total'),
+                        func.count().filter(Show.counted_upcoming).label('upcoming'))\
+            .where(condition, show_fk.is_not(None))\
+            .group_by(show_fk)\
+            .subquery()
+        table = model.__table__
+        connection.execute(
+            update(table)
+            .where(table.c.id == counts.c.parent_id)
+            .values(upcoming_shows_count=table.c.upcoming_shows_count - counts.c.upcoming,
+                    past_shows_count=table.c.past_shows_count - (counts.c.total - counts.c.upcoming))
+        )
+
+
+#----------------------------------------------------------------------------#
+# Time passing.
+#----------------------------------------------------------------------------#
+
+def roll_over_counters(connection, now=None):
+    # Moves the shows counted as upcoming that have started to the past
+    # counters; returns how many. Concurrent runs are safe: the UPDATE flips
+    # each show once and only the rows it flipped are counted.
+    now = now or datetime.now(timezone.utc)
+    shows = Show.__table__
+    moved = connection.execute(
+        update(shows)
+        .where(shows.c.counted_upcoming, shows.c.start_time <= now)
+        .values(counted_upcoming=False)
+        .returning(shows.c.venue_id, shows.c.artist_id)
+    ).all()
+
+    for model, position in ((Venue, 0), (Artist, 1)):
+        by_parent = Counter(row[position] for row in moved if row[position] is not None)
+        if not by_parent:
+            continue
+        table = model.__table__
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam('parent_id'))
+            .values(upcoming_shows_count=table.c.upcoming_shows_count - bindparam('moved'),
+                    past_shows_count=table.c.past_shows_count + bindparam('moved')),
+            [{'parent_id': parent_id, 'moved': count} for parent_id, count in by_parent.items()]
+        )
+    return len(moved)
+
+
+class RollOverSchedule:
+    # When the roll-over of one app is due.
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = Lock()
+        self.next_run = 0
+
+
+class CounterRollOver:
+    def init_app(self, app):
+        interval = app.config.get('COUNTERS_ROLL_OVER_SECONDS', 60)
+        if interval:
+            app.extensions['counter_roll_over'] = RollOverSchedule(interval)
+            app.before_request(self.before_request)
+
+    def before_request(self):
+        # one request per worker and interval pays for it, on the primary
+        # and in a transaction of its own
+        schedule = current_app.extensions['counter_roll_over']
+        if monotonic() < schedule.next_run or not schedule.lock.acquire(blocking=False):
+            return
+        try:
+            schedule.next_run = monotonic() + schedule.interval
+            with db.engine.begin() as connection:
+                roll_over_counters(connection)
+        except Exception:
+            current_app.logger.exception('Show counter roll-over failed')
+        finally:
+            schedule.lock.release()
+
+
+counter_roll_over = CounterRollOver()
+
+#----------------------------------------------------------------------------#
+# Bulk reconciliation.
+#----------------------------------------------------------------------------#
+
+def reconcile_counters(now=None):
+    # Recomputes every counter, and the counter each show is counted in, with
+    # one set-based UPDATE per table; returns the number of rows that had
+    # drifted.
+    now = now or datetime.now(timezone.utc)
+    drift = {}
+
+    upcoming = Show.start_time > now
+    result = db.session.execute(
+        update(Show)
+        .where(Show.counted_upcoming != upcoming)
+        .values(counted_upcoming=upcoming)
+        .execution_options(synchronize_session=False)
+    )
+    drift[Show.__tablename__] = result.rowcount
+
+    for model, fk in PARENTS:
+        show_fk = getattr(Show, fk)
+        upcoming = select(func.count(Show.id))\
+            .where(show_fk == model.id, Show.start_time > now)\
+            .scalar_subquery()
+        past = select(func.count(Show.id))\
+            .where(show_fk == model.id, Show.start_time <= now)\
+            .scalar_subquery()
+
+        result = db.session.execute(
+            update(model)
+            .where(or_(model.upcoming_shows_count != upcoming,
+                       model.past_shows_count != past))
+            .values(upcoming_shows_count=upcoming, past_shows_count=past)
+            .execution_options(synchronize_session=False)
+        )
+        drift[model.__tablename__] = result.rowcount
+
+    db.session.commit()
+    return drift
+
+
+counters_cli = AppGroup('counters', help='Maintain denormalized show counters.')
+
+@counters_cli.command('roll-over')
+def roll_over_command():
+    """Move started shows from the upcoming to the past counters."""
+    with db.engine.begin() as connection:
+        moved = roll_over_counters(connection)
+    click.echo(f'{moved} show(s) moved to the past counters')
+
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """Recompute show counters and report drift."""
+    drift = reconcile_counters()
+    for table, rows in drift.items():
+        click.echo(f'{table}: {rows} row(s) corrected')
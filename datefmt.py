@@ -0,0 +1,71 @@
+from datetime import timezone
+from functools import lru_cache
+from babel import Locale
+from babel.dates import parse_pattern, get_timezone
+
+#----------------------------------------------------------------------------#
+# Date formatting for templates (the `datetime` filter).
+#
+# Babel patterns are parsed once per format, locales and time zones looked
+# up once, and formatted values are kept in a bounded LRU: show listings
+# repeat the same start times over and over, so most of them are a cache
+# hit. Views format whole show lists with format_many(). Values are
+# datetime objects; ISO strings are still accepted.
+#----------------------------------------------------------------------------#
+
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+FORMATTED_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def _pattern(format):
+    return parse_pattern(PATTERNS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def _locale(name):
+    return Locale.parse(name)
+
+
+@lru_cache(maxsize=None)
+def _timezone(name):
+    return get_timezone(name)
+
+
+@lru_cache(maxsize=FORMATTED_CACHE_SIZE)
+def _format(value, zone, format, locale, tzinfo):
+    # Same rules as babel.dates.format_datetime: naive values are UTC, and
+    # aware values keep their own zone unless tzinfo is given. `zone` is
+    # value.tzinfo, part of the cache key: aware datetimes compare equal
+    # (and hash alike) for the same instant in different zones.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if tzinfo is not None:
+        value = value.astimezone(_timezone(tzinfo))
+    return _pattern(format).apply(value, _locale(locale))
+
+
+def format_datetime(value, format='medium', locale='en', tzinfo=None):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        # only legacy callers pass strings
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _format(value, value.tzinfo, format, locale, tzinfo)
+
+
+def format_many(values, format='medium', locale='en', tzinfo=None):
+    # Formats a list of values (a show listing), each distinct value once.
+    done = {}
+    formatted = []
+    for value in values:
+        key = (value, getattr(value, 'tzinfo', None))
+        if key not in done:
+            done[key] = format_datetime(value, format, locale, tzinfo)
+        formatted.append(done[key])
+    return formatted
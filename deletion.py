@@ -0,0 +1,119 @@
+from time import sleep
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete
+from models import Venue, Artist, Show, db
+from counters import PARENTS, remove_show_counts
+from cache import page_cache, entity_cache
+from schedule import day_start
+
+#----------------------------------------------------------------------------#
+# Set-based deletion in bounded batches.
+#
+#   flask delete venues 12 13 14 [--batch-size 1000] [--pause 0.1]
+#   flask delete artists 7
+#   flask delete shows --before 2020-01-01
+#
+# Shows go first, batch_size at a time: each batch adjusts the show counters
+# of the affected venues and artists with one grouped UPDATE per table,
+# deletes the shows by primary key and commits. Then the venues (artists)
+# themselves are deleted; the ON DELETE CASCADE of Show's foreign keys
+# covers shows booked meanwhile. Transactions stay short, so the row locks
+# they take are released quickly, and readers (MVCC) are never blocked;
+# --pause leaves room between batches for replicas and vacuum.
+#----------------------------------------------------------------------------#
+
+BATCH_SIZE = 1000
+
+FOREIGN_KEYS = {
+    Venue: 'venue_id',
+    Artist: 'artist_id',
+}
+
+
+def _chunks(ids, size):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def delete_shows(condition, batch_size=BATCH_SIZE, pause=0, parents=PARENTS):
+    # Deletes the shows matching `condition`; returns how many.
+    deleted = 0
+    while True:
+        ids = [x for (x,) in db.session.query(Show.id).filter(condition)
+                                       .order_by(Show.id).limit(batch_size)]
+        if not ids:
+            break
+        connection = db.session.connection()
+        remove_show_counts(connection, Show.id.in_(ids), parents)
+        connection.execute(delete(Show.__table__).where(Show.__table__.c.id.in_(ids)))
+        db.session.commit()
+        deleted += len(ids)
+        if pause:
+            sleep(pause)
+    return deleted
+
+
+def delete_entities(model, ids, batch_size=BATCH_SIZE, pause=0):
+    # Deletes venues or artists with their shows; returns the numbers of
+    # rows deleted. Cached pages are the caller's business.
+    show_fk = getattr(Show, FOREIGN_KEYS[model])
+    # the counters of the rows being deleted need no update
+    parents = [(x, fk) for x, fk in PARENTS if x is not model]
+    table = model.__table__
+    deleted = {model.__tablename__: 0, Show.__tablename__: 0}
+
+    for chunk in _chunks(ids, batch_size):
+        deleted[Show.__tablename__] += delete_shows(show_fk.in_(chunk), batch_size, pause, parents)
+        result = db.session.execute(delete(table).where(table.c.id.in_(chunk)))
+        db.session.commit()
+        deleted[model.__tablename__] += result.rowcount
+        entity_cache.discard(model, chunk)
+    return deleted
+
+
+def delete_past_shows(before, batch_size=BATCH_SIZE, pause=0):
+    return {Show.__tablename__: delete_shows(Show.start_time < before, batch_size, pause)}
+
+
+delete_cli = AppGroup('delete', help='Delete rows in bounded batches.')
+
+batch_size_option = click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+                                 help='Rows per transaction.')
+pause_option = click.option('--pause', default=0.0, show_default=True,
+                            help='Seconds to wait between batches.')
+
+
+def _report(deleted):
+    page_cache.clear()
+    for table, count in deleted.items():
+        click.echo(f'{table}: {count} row(s) deleted')
+
+
+@delete_cli.command('venues')
+@click.argument('ids', nargs=-1, type=int, required=True)
+@batch_size_option
+@pause_option
+def delete_venues_command(ids, batch_size, pause):
+    """Delete venues and their shows."""
+    _report(delete_entities(Venue, ids, batch_size, pause))
+
+
+@delete_cli.command('artists')
+@click.argument('ids', nargs=-1, type=int, required=True)
+@batch_size_option
+@pause_option
+def delete_artists_command(ids, batch_size, pause):
+    """Delete artists and their shows."""
+    _report(delete_entities(Artist, ids, batch_size, pause))
+
+
+@delete_cli.command('shows')
+@click.option('--before', required=True, type=click.DateTime(['%Y-%m-%d']),
+              help='Delete the shows starting before this day (UTC).')
+@batch_size_option
+@pause_option
+def delete_shows_command(before, batch_size, pause):
+    """Delete all shows starting before a date."""
+    _report(delete_past_shows(day_start(before.date()), batch_size, pause))
@@ -1,4 +1,5 @@
 import enum
+from functools import cache
 
 
 class SelectEnum(enum.Enum):
@@ -23,6 +24,11 @@ class SelectEnum(enum.Enum):
             for c in cls
         ]
 
+    @classmethod
+    @cache
+    def validation_set(cls):
+        return frozenset(cls.validation_list())
+
 
 class Genres(SelectEnum):
     Alternative         = 'Alternative'
@@ -0,0 +1,153 @@
+import json
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from models import Venue, Artist, db
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Index advisor.
+#
+#   flask explain [--endpoint show_venue] [--min-rows 1000]
+#
+# Requests every GET route through the test client, records the SELECT
+# statements it runs, and EXPLAINs each of them (with its parameters)
+# against the current database. Reported per route: the estimated cost of
+# every statement and the sequential scans over tables estimated to hold
+# at least --min-rows rows, i.e. the queries that would want an index.
+# PostgreSQL only; nothing is written.
+#----------------------------------------------------------------------------#
+
+# routes that stream whole tables or do not query at all
+SKIP = {'static', 'metrics', 'cache_stats', 'export'}
+
+# query strings making the search routes actually search
+QUERY_STRINGS = {
+    'search_venues': 'search_term=the',
+    'search_artists': 'search_term=the',
+    'search_venues_advanced': 'name=the',
+    'search_artists_advanced': 'name=the',
+    'lookup_venues': 'q=th',
+    'lookup_artists': 'q=th',
+}
+
+
+def sample_urls(app):
+    # One URL per GET route, with view arguments pointing at existing rows.
+    venue_id = db.session.query(func.min(Venue.id)).scalar() or 1
+    artist_id = db.session.query(func.min(Artist.id)).scalar() or 1
+    samples = {'venue_id': venue_id, 'artist_id': artist_id, 'id': venue_id, 'entity': 'venues'}
+
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.endpoint in SKIP:
+            continue
+        if any(arg not in samples for arg in rule.arguments):
+            continue
+        path = rule.build({arg: samples[arg] for arg in rule.arguments}, append_unknown=False)[1]
+        query = QUERY_STRINGS.get(rule.endpoint)
+        urls.append((rule.endpoint, f'{path}?{query}' if query else path))
+    return sorted(set(urls))
+
+
+def capture(app, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    return response.status_code, statements
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def table_rows(connection, table, known):
+    # Estimated rows of the table (not of the scan's output, which a
+    # selective filter makes small): pg_class.reltuples, or the live tuple
+    # count of a table never analyzed (reltuples -1).
+    if table not in known:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT GREATEST(reltuples, pg_stat_get_live_tuples(oid)) '
+                           'FROM pg_class WHERE oid = to_regclass(quote_ident(%s))', (table,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        known[table] = int(row[0]) if row else 0
+    return known[table]
+
+
+def explain(connection, statement, parameters):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+@click.command('explain')
+@click.option('--endpoint', multiple=True, help='Only these endpoints (repeatable).')
+@click.option('--min-rows', default=1000, show_default=True,
+              help='Ignore sequential scans of tables estimated smaller than this.')
+@with_appcontext
+def explain_command(endpoint, min_rows):
+    """EXPLAIN the queries of every route and report sequential scans."""
+    if db.engine.dialect.name != 'postgresql':
+        click.echo('Not a PostgreSQL database: nothing to explain.')
+        return
+
+    app = current_app._get_current_object()
+    cache = page_cache.store()
+    cache_enabled, cache.enabled = cache.enabled, False
+    flagged = {}
+    sizes = {}
+    connection = db.engine.raw_connection()
+    try:
+        for name, url in sample_urls(app):
+            if endpoint and name not in endpoint:
+                continue
+            status, statements = capture(app, url)
+            click.echo(f'{url}  [{name}, HTTP {status}, {len(statements)} statement(s)]')
+            for statement, parameters in statements:
+                plan = explain(connection, statement, parameters)
+                scans = [
+                    (node, rows) for node in plan_nodes(plan) if node['Node Type'] == 'Seq Scan'
+                    for rows in [table_rows(connection, node.get('Relation Name'), sizes)]
+                    if rows >= min_rows
+                ]
+                summary = ' '.join(statement.split())
+                click.echo(f'  cost {plan["Total Cost"]:>10.1f}  rows {plan["Plan Rows"]:>7}  '
+                           f'{summary[:90]}{"..." if len(summary) > 90 else ""}')
+                for node, rows in scans:
+                    table = node.get('Relation Name')
+                    click.echo(click.style(
+                        f'    Seq Scan on {table} (~{rows} rows): ~{node["Plan Rows"]} returned, '
+                        f'cost {node["Total Cost"]:.1f}'
+                        + (f', filter {node["Filter"]}' if 'Filter' in node else ''),
+                        fg='yellow'))
+                    flagged.setdefault(table, set()).add(name)
+    finally:
+        connection.close()
+        cache.enabled = cache_enabled
+
+    click.echo()
+    if not flagged:
+        click.echo(f'No sequential scans over tables of {min_rows}+ rows.')
+    for table, endpoints in sorted(flagged.items()):
+        click.echo(f'{table}: sequentially scanned by {", ".join(sorted(endpoints))}')
@@ -0,0 +1,112 @@
+import io
+import csv
+import json
+from datetime import datetime, date
+import click
+from flask.cli import with_appcontext
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Streaming export of shows, venues and artists.
+#
+# Rows are read through a server-side cursor (yield_per) as plain column
+# tuples, venue and artist names are joined in SQL, and the encoded output is
+# handed on in chunks of CHUNK_SIZE bytes, so memory use does not depend on
+# the table size. Used by the /export/ endpoints and by `flask export`.
+#----------------------------------------------------------------------------#
+
+YIELD_PER = 1000
+# bytes of encoded output handed on at a time
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _table_columns(model):
+    return [column for column in model.__table__.columns]
+
+
+def export_query(entity, start=None, end=None, updated_since=None):
+    # start/end filter shows by start_time and venues/artists by created_at.
+    if entity == 'shows':
+        columns = [
+            Show.id, Show.start_time, Show.updated_at,
+            Show.venue_id, Venue.name.label('venue_name'),
+            Venue.city.label('venue_city'), Venue.state.label('venue_state'),
+            Show.artist_id, Artist.name.label('artist_name'),
+        ]
+        query = db.session.query(*columns).join(Show.venue).join(Show.artist)
+        model, timeline = Show, Show.start_time
+    else:
+        model = Venue if entity == 'venues' else Artist
+        query = db.session.query(*_table_columns(model))
+        timeline = model.created_at
+
+    if start:
+        query = query.filter(timeline >= start)
+    if end:
+        query = query.filter(timeline < end)
+    if updated_since:
+        query = query.filter(model.updated_at >= updated_since)
+
+    return query.order_by(model.id).execution_options(yield_per=YIELD_PER)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c['name'] for c in query.column_descriptions])
+    for row in query:
+        writer.writerow([
+            ';'.join(x) if isinstance(x, list) else _plain(x)
+            for x in row
+        ])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(query):
+    names = [c['name'] for c in query.column_descriptions]
+    lines = []
+    size = 0
+    for row in query:
+        line = json.dumps(dict(zip(names, map(_plain, row)))) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    yield ''.join(lines)
+
+
+def export(entity, format, **filters):
+    query = export_query(entity, **filters)
+    return encode_csv(query) if format == 'csv' else encode_ndjson(query)
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(['shows', 'venues', 'artists']))
+@click.option('--format', 'format', type=click.Choice(list(FORMATS)), default='ndjson',
+              show_default=True)
+@click.option('--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+@click.option('--from', 'start', type=click.DateTime(), help='Shows starting (or rows created) from.')
+@click.option('--to', 'end', type=click.DateTime(), help='... and before this date.')
+@click.option('--updated-since', type=click.DateTime(), help='Rows updated since (incremental pulls).')
+@with_appcontext
+def export_command(entity, format, output, start, end, updated_since):
+    """Stream ENTITY rows as CSV or NDJSON."""
+    for chunk in export(entity, format, start=start, end=end, updated_since=updated_since):
+        output.write(chunk)
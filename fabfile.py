@@ -1,3 +1,4 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -5,9 +6,11 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # route benchmark against the stored baselines (benchmarks/bench_routes.py)
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python benchmarks/bench_routes.py {} --generate".format(
+                os.environ['BENCH_DATABASE_URL']), capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
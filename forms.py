@@ -1,9 +1,11 @@
 import re
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, optional, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, DateField, BooleanField, IntegerField
+from wtforms.widgets import HiddenInput
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, optional, ValidationError
 from enums import Genres, States
+from models import Venue, Artist, db
 
 # Phone number validator
 def valid_phone(form, field):
@@ -14,37 +16,38 @@ def valid_phone(form, field):
 
 # State validator
 def valid_state(form, field):
-    if field.data not in States.validation_list():
+    if field.data not in States.validation_set():
         raise ValidationError('Invalid state.')
 
 # Genres validator
 def valid_genres(form, field):
-    if not set(field.data).issubset(Genres.validation_list()):
+    if not Genres.validation_set().issuperset(field.data):
         raise ValidationError('Invalid genres.')
 
+# Existence validator: a primary key lookup instead of a full choice list
+def exists(model):
+    def validator(form, field):
+        found = db.session.query(model.id).filter(model.id == field.data).first()
+        if found is None:
+            raise ValidationError(f'Unknown {model.__name__.lower()}.')
+    validator.model = model
+    return validator
 
-class ShowForm(Form):
-    def __init__(self, formdata=None, **kwargs):
-        super().__init__(formdata, **kwargs)
-        if 'venues' in kwargs:
-                venue_choices = [(c.id, c.name) for c in kwargs['venues']]
-                venue_choices.insert(0, ('',''))                
-                self.venue_id.choices = venue_choices
-        
-        if 'artists' in kwargs:
-                artist_choices = [(c.id, c.name) for c in kwargs['artists']]
-                artist_choices.insert(0, ('',''))
-                self.artist_id.choices = artist_choices
 
-    artist_id = SelectField(
+class ShowForm(Form):
+    # The artist and venue are picked with the typeahead inputs, which fill
+    # in the hidden id fields (see /artists/lookup/ and /venues/lookup/).
+    artist_name = StringField('Artist')
+    artist_id = IntegerField(
         'Artist',
-        validators=[DataRequired()],
-        choices=[]
+        validators=[DataRequired(), exists(Artist)],
+        widget=HiddenInput()
     )
-    venue_id = SelectField(
+    venue_name = StringField('Venue')
+    venue_id = IntegerField(
         'Venue',
-        validators=[DataRequired()],
-        choices=[]
+        validators=[DataRequired(), exists(Venue)],
+        widget=HiddenInput()
     )
     start_time = DateTimeField(
             'Start Time', 
@@ -52,6 +55,18 @@ class ShowForm(Form):
             default=datetime.today(),
             format='%Y-%m-%d %H:%M'
     )
+    # not columns: the end time is start_time + duration; weeks > 1 lists
+    # a weekly series (see booking.py)
+    duration = IntegerField(
+        'Duration (minutes)',
+        validators=[optional(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
+    weeks = IntegerField(
+        'Repeat weekly (shows)',
+        validators=[optional(), NumberRange(min=1, max=52)],
+        default=1
+    )
 
 
 class VenueForm(Form):
@@ -112,4 +127,13 @@ class ArtistForm(Form):
 class SearchForm(Form):
     name = StringField('Name') 
     city = StringField('City')
-    state = SelectField('State', choices=States.choices_first_blank())    
\ No newline at end of file
+    state = SelectField('State', choices=States.choices_first_blank())    
+    genres = SelectMultipleField('Genres', choices=Genres.choices())
+
+
+class ShowSearchForm(Form):
+    city = StringField('City')
+    # blank or left out: any state
+    state = SelectField('State', choices=States.choices_first_blank(), default='')
+    start = DateField('From', validators=[optional()])
+    end = DateField('To', validators=[optional()])
@@ -0,0 +1,54 @@
+#----------------------------------------------------------------------------#
+# gunicorn configuration.
+#
+#   SECRET_KEY=... DATABASE_URL=... gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Every setting can be overridden from the environment (below) or on the
+# command line (gunicorn -c gunicorn.conf.py -w 4 wsgi:app).
+#
+# Running several workers or nodes:
+# - SECRET_KEY must be the same everywhere, or a session/flash cookie set
+#   by one worker is rejected by the next. Without it, the workers of one
+#   node share a key stored in the instance folder (see create_app()).
+# - The app is built once in the master (preload_app) and forked: workers
+#   share its memory pages and start faster. Connection pools and the query
+#   thread pool are reset in each child (os.register_at_fork in app.py and
+#   concurrency.py), so no connection is ever shared between processes.
+# - Each worker has its own pool of DB_POOL_SIZE + DB_MAX_OVERFLOW
+#   connections (config.py): workers x that, summed over the nodes, must
+#   stay below the server's max_connections (or go through pgbouncer).
+# - The page cache and /metrics are per worker.
+#
+# Sync workers fit CPU-bound rendering: about one per core is enough, more
+# only help while requests wait on the database. For many slow concurrent
+# requests use GUNICORN_WORKER_CLASS=gevent with the wsgi_gevent:app entry
+# point instead.
+#----------------------------------------------------------------------------#
+import os
+import multiprocessing
+
+bind = f'{os.environ.get("HOST", "0.0.0.0")}:{os.environ.get("PORT", "8000")}'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then, staggered, to bound slow memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+# GUNICORN_ACCESS_LOG= (empty) turns the access log off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    # FLASK_WARMUP=true: open the connections before accepting requests
+    app = worker.wsgi
+    if getattr(app, 'config', {}).get('WARMUP'):
+        from warmup import prime_pools
+        prime_pools(app)
@@ -0,0 +1,273 @@
+import os
+import csv
+import json
+from datetime import datetime, timezone
+from time import perf_counter
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from wtforms import BooleanField, DateTimeField, IntegerField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import StopValidation, ValidationError
+from forms import VenueForm, ArtistForm, ShowForm
+from models import Venue, Artist, Show, db, DEFAULT_SHOW_DURATION
+from counters import apply_show_deltas
+from booking import conflicts, overlapping
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Bulk streaming import of venues, artists and shows.
+#
+#   flask import venues partner.csv [--format csv|ndjson] [--batch-size 5000] [--resume]
+#
+# Rows are read one at a time from CSV or NDJSON and validated with the
+# validators declared on VenueForm/ArtistForm/ShowForm, run against a bare
+# field stand-in instead of a form instance. Valid rows are written with one
+# executemany INSERT per batch; existence checks (the forms' exists()
+# validators) are resolved with one query per batch as well.
+#
+# After every committed batch the number of consumed input rows is written
+# to <file>.progress, so an interrupted import continues where it stopped
+# with --resume. Rejected rows go to <file>.rejects.ndjson, shows included
+# when they double-book a venue or an artist (see booking.py).
+#----------------------------------------------------------------------------#
+
+ENTITIES = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'on'}
+
+
+class RowField:
+    # The parts of a wtforms Field that validators use.
+    def __init__(self, raw, data):
+        self.raw_data = [] if raw in (None, '') else [raw]
+        self.data = data
+        self.errors = []
+
+    @staticmethod
+    def gettext(string):
+        return string
+
+    @staticmethod
+    def ngettext(singular, plural, n):
+        return singular if n == 1 else plural
+
+
+class RowSchema:
+    def __init__(self, model, form_class):
+        self.model = model
+        columns = model.__table__.columns
+        self.fields = []
+        for name in dir(form_class):
+            unbound = getattr(form_class, name)
+            if not isinstance(unbound, UnboundField) or name not in columns:
+                continue
+            validators = unbound.kwargs.get('validators') or []
+            self.fields.append((
+                name,
+                unbound.field_class,
+                unbound.kwargs,
+                [v for v in validators if not hasattr(v, 'model')],
+                [v.model for v in validators if hasattr(v, 'model')],
+            ))
+
+    def coerce(self, field_class, kwargs, raw):
+        if issubclass(field_class, SelectMultipleField):
+            if raw in (None, ''):
+                return []
+            if isinstance(raw, list):
+                return raw
+            return [x.strip() for x in str(raw).split(';') if x.strip()]
+        if issubclass(field_class, BooleanField):
+            return raw if isinstance(raw, bool) else str(raw or '').strip().lower() in TRUE_VALUES
+        if raw in (None, ''):
+            return None if issubclass(field_class, (IntegerField, DateTimeField)) else ''
+        if issubclass(field_class, IntegerField):
+            try:
+                return int(raw)
+            except (TypeError, ValueError):
+                raise ValidationError('Not a valid integer value.')
+        if issubclass(field_class, DateTimeField):
+            try:
+                value = datetime.fromisoformat(str(raw))
+            except ValueError:
+                try:
+                    value = datetime.strptime(str(raw), kwargs.get('format', '%Y-%m-%d %H:%M:%S'))
+                except ValueError:
+                    raise ValidationError('Not a valid datetime value.')
+            # aware UTC, so that rows with and without an offset compare;
+            # times without one are local, as for the counters
+            return value.astimezone(timezone.utc)
+        return str(raw)
+
+    def validate(self, raw_row):
+        # Returns (values, errors, references) where references lists the
+        # (model, id) pairs still to be checked for existence.
+        values = {}
+        errors = {}
+        references = []
+        for name, field_class, kwargs, validators, models in self.fields:
+            raw = raw_row.get(name)
+            try:
+                data = self.coerce(field_class, kwargs, raw)
+            except ValidationError as e:
+                errors[name] = [str(e)]
+                continue
+
+            field = RowField(raw, data)
+            for validator in validators:
+                try:
+                    validator(None, field)
+                except StopValidation as e:
+                    if str(e):
+                        field.errors.append(str(e))
+                    break
+                except ValidationError as e:
+                    field.errors.append(str(e))
+
+            if field.errors:
+                errors[name] = field.errors
+                continue
+            values[name] = data
+            references += [(model, name, data) for model in models if data is not None]
+        return values, errors, references
+
+
+def read_rows(path, format):
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Importer:
+    def __init__(self, entity, path, format, batch_size, rejects):
+        self.model, form_class = ENTITIES[entity]
+        self.schema = RowSchema(self.model, form_class)
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.rejects = rejects
+        self.progress_path = f'{path}.progress'
+        self.read = self.inserted = self.rejected = 0
+
+    def checkpoint(self):
+        with open(self.progress_path, 'w') as f:
+            f.write(str(self.read))
+
+    def resume_position(self):
+        try:
+            with open(self.progress_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def reject(self, line, row, errors):
+        self.rejected += 1
+        self.rejects.write(json.dumps({'line': line, 'errors': errors, 'row': row}, default=str) + '\n')
+
+    def flush(self, batch):
+        # batch: [(line, raw_row, values, references)]
+        missing = set()
+        by_model = {}
+        for _, _, _, references in batch:
+            for model, name, value in references:
+                by_model.setdefault(model, set()).add(value)
+        for model, ids in by_model.items():
+            found = {x for (x,) in db.session.query(model.id).filter(model.id.in_(ids))}
+            missing |= {(model, x) for x in ids - found}
+
+        accepted = []
+        for line, raw_row, values, references in batch:
+            unknown = {name: [f'Unknown {model.__name__.lower()}.']
+                       for model, name, value in references if (model, value) in missing}
+            if unknown:
+                self.reject(line, raw_row, unknown)
+            else:
+                accepted.append((line, raw_row, values))
+        if self.model is Show:
+            accepted = self.without_double_bookings(accepted)
+        rows = [values for _, _, values in accepted]
+
+        if rows:
+            connection = db.session.connection()
+            if self.model is Show:
+                # sets the rows' counted_upcoming: before the INSERT
+                apply_show_deltas(connection, rows)
+            connection.execute(insert(self.model.__table__), rows)
+        db.session.commit()
+        self.inserted += len(rows)
+        self.checkpoint()
+
+    def without_double_bookings(self, accepted):
+        # Shows overlapping a booked show, or an earlier row of the batch,
+        # of the same venue or artist are rejected (one query per batch).
+        for _, _, values in accepted:
+            values['end_time'] = values['start_time'] + DEFAULT_SHOW_DURATION
+        slots = [(x['venue_id'], x['artist_id'], x['start_time'], x['end_time'])
+                 for _, _, x in accepted]
+        clashes = overlapping(slots) | {x.slot for x in conflicts(slots)}
+        for i in sorted(clashes):
+            line, raw_row, _ = accepted[i]
+            self.reject(line, raw_row, {'start_time': ['The venue or the artist is already booked.']})
+        return [x for i, x in enumerate(accepted) if i not in clashes]
+
+    def run(self, resume=False, report=None):
+        skip = self.resume_position() if resume else 0
+        batch = []
+        for line, raw_row in enumerate(read_rows(self.path, self.format), start=1):
+            if line <= skip:
+                continue
+            self.read = line
+            values, errors, references = self.schema.validate(raw_row)
+            if errors:
+                self.reject(line, raw_row, errors)
+            else:
+                batch.append((line, raw_row, values, references))
+
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+                if report:
+                    report(self)
+        self.flush(batch)
+
+        page_cache.clear()
+
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(list(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format (default: from the file extension).')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--resume', is_flag=True, help='Continue after the last committed batch.')
+@with_appcontext
+def import_command(entity, path, format, batch_size, resume):
+    """Import ENTITY rows from a CSV or NDJSON file."""
+    if format is None:
+        format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+    start = perf_counter()
+
+    def report(importer):
+        elapsed = perf_counter() - start
+        click.echo(f'{importer.read} read, {importer.inserted} inserted, '
+                   f'{importer.rejected} rejected ({importer.inserted / elapsed:.0f} rows/s)')
+
+    with open(f'{path}.rejects.ndjson', 'a' if resume else 'w') as rejects:
+        importer = Importer(entity, path, format, batch_size, rejects)
+        importer.run(resume=resume, report=report)
+
+    report(importer)
+    if importer.rejected:
+        click.echo(f'rejected rows written to {path}.rejects.ndjson')
+    os.remove(importer.progress_path)
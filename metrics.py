@@ -0,0 +1,218 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from flask import Response, request, current_app, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from cache import page_cache, entity_cache
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+# Every request records its latency, the number of SQL statements it ran and
+# the time spent in them (SQLAlchemy cursor events on every engine, replicas
+# included), and the time spent rendering templates. The aggregates are
+# served in the Prometheus text format on /metrics; requests running more
+# than QUERY_BUDGET statements are logged as warnings.
+#
+# Like the page cache, the numbers are per worker process, and per app:
+# each app keeps its Registry in app.extensions['metrics'].
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.render_starts = []
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+
+    def observe(self, value, *labels):
+        counts, total = self.series.get(labels, (None, 0.0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self.series.items()):
+            base = _labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{base}}} {total:.6f}'
+            yield f'{self.name}_count{{{base}}} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, *labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{{{_labels(self.labels, labels)}}} {value}'
+
+
+def _labels(names, values):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in zip(names, values))
+
+
+#----------------------------------------------------------------------------#
+# SQL and template timing.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        connection.info.setdefault('query_start', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = connection.info.get('query_start')
+    if stats is not None and starts:
+        stats.statements += 1
+        stats.db_time += perf_counter() - starts.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _current.get()
+    if stats is not None:
+        stats.render_starts.append(perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stats = _current.get()
+    if stats is not None and stats.render_starts:
+        elapsed = perf_counter() - stats.render_starts.pop()
+        stats.template_time += elapsed
+        sender.extensions['metrics'].observe_template(template.name or '<string>', elapsed)
+
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+class Registry:
+    # The metrics of one app.
+    def __init__(self, query_budget=0):
+        self.lock = Lock()
+        self.query_budget = query_budget
+        self.requests = Counter('fyyur_requests_total', 'Requests served.',
+                                ('endpoint', 'method', 'status'))
+        self.latency = Histogram('fyyur_request_duration_seconds', 'Request latency.',
+                                 LATENCY_BUCKETS, ('endpoint', 'method'))
+        self.statements = Histogram('fyyur_db_statements_per_request', 'SQL statements per request.',
+                                    STATEMENT_BUCKETS, ('endpoint',))
+        self.db_time = Histogram('fyyur_db_duration_seconds', 'Time spent in SQL per request.',
+                                 LATENCY_BUCKETS, ('endpoint',))
+        self.render_time = Histogram('fyyur_template_render_seconds', 'Template render time.',
+                                     LATENCY_BUCKETS, ('template',))
+        self.over_budget = Counter('fyyur_query_budget_exceeded_total',
+                                   'Requests that ran more statements than QUERY_BUDGET.',
+                                   ('endpoint',))
+
+    def finish(self, stats, response):
+        endpoint = request.endpoint or 'none'
+        elapsed = perf_counter() - stats.start
+        with self.lock:
+            self.requests.inc(endpoint, request.method, response.status_code)
+            self.latency.observe(elapsed, endpoint, request.method)
+            self.statements.observe(stats.statements, endpoint)
+            self.db_time.observe(stats.db_time, endpoint)
+            if self.query_budget and stats.statements > self.query_budget:
+                self.over_budget.inc(endpoint)
+
+        if self.query_budget and stats.statements > self.query_budget:
+            current_app.logger.warning('%s %s ran %d SQL statements (budget %d)',
+                                       request.method, request.full_path.rstrip('?'),
+                                       stats.statements, self.query_budget)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} statements"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={elapsed * 1000:.1f}',
+        ])
+        return response
+
+    def observe_template(self, name, elapsed):
+        with self.lock:
+            self.render_time.observe(elapsed, name)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.statements, self.db_time,
+                           self.render_time, self.over_budget):
+                lines += metric.lines()
+
+        for prefix, cache, label in (('page_cache', page_cache, 'Page cache'),
+                                     ('entity_cache', entity_cache, 'Entity cache')):
+            stats = cache.stats()
+            for name, type in (('hits', 'counter'), ('misses', 'counter'),
+                               ('evictions', 'counter'), ('size', 'gauge')):
+                suffix = '_total' if type == 'counter' else ''
+                lines += [
+                    f'# HELP fyyur_{prefix}_{name}{suffix} {label} {name}.',
+                    f'# TYPE fyyur_{prefix}_{name}{suffix} {type}',
+                    f'fyyur_{prefix}_{name}{suffix} {stats[name]}',
+                ]
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.extensions['metrics'] = Registry(app.config.get('QUERY_BUDGET', 0))
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_rendered, app)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def _start(self):
+        _current.set(RequestStats())
+
+    def _finish(self, response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        _current.set(None)
+        return current_app.extensions['metrics'].finish(stats, response)
+
+    def view(self):
+        return Response(current_app.extensions['metrics'].render(),
+                        mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
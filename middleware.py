@@ -0,0 +1,180 @@
+import gzip
+import zlib
+from time import time
+from flask import request, session, current_app
+from routing import READ_PRIMARY_UNTIL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression and HTTP cache policies.
+#
+# Compression: text responses of at least COMPRESS_MIN_SIZE bytes are
+# encoded with the first of COMPRESS_ALGORITHMS the client accepts (br is
+# skipped when the brotli module is not installed). Streamed responses have
+# no size up front; with COMPRESS_STREAMS they are compressed chunk by chunk,
+# each chunk flushed so the client still receives it right away. Files
+# (send_file) are left alone: the built assets come precompressed.
+#
+# Cache policies: views are tagged with @cache_policy.policy('listing'),
+# and their successful GET responses get the matching Cache-Control of
+# HTTP_CACHE_POLICIES. A response rendered for one client is made private
+# whatever the policy: it changed the session (a flashed message was shown,
+# a write was recorded), a flash is still pending, or the client is within
+# READ_AFTER_WRITE_SECONDS of its last write. Responses of no-cache
+# policies get an ETag, so revalidating them costs a 304 when unchanged.
+#----------------------------------------------------------------------------#
+
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'image/svg+xml',
+}
+
+
+class Encoder:
+    # One-shot and incremental compression for a content coding.
+    def __init__(self, name, level):
+        self.name = name
+        self.level = level
+
+    def compress(self, data):
+        if self.name == 'br':
+            return brotli.compress(data, quality=self.level)
+        return gzip.compress(data, self.level, mtime=0)
+
+    def stream(self, chunks):
+        if self.name == 'br':
+            compressor = brotli.Compressor(quality=self.level)
+            for chunk in chunks:
+                data = compressor.process(_bytes(chunk)) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                data = compressor.compress(_bytes(chunk)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+
+
+def _bytes(chunk):
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+class Compressor:
+    # The compression settings of one app.
+    def __init__(self, encoders, min_size=500, streams=True):
+        self.encoders = encoders
+        self.min_size = min_size
+        self.streams = streams
+
+    def compressible(self, response):
+        return (response.mimetype in COMPRESSIBLE
+                and 200 <= response.status_code < 300 and response.status_code != 206
+                and 'Content-Encoding' not in response.headers
+                and not response.direct_passthrough
+                and not response.cache_control.no_transform)
+
+    def encoder(self):
+        for encoder in self.encoders:
+            if request.accept_encodings[encoder.name]:
+                return encoder
+        return None
+
+    def compress(self, response):
+        if not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoder = self.encoder()
+        if encoder is None:
+            return response
+
+        if response.is_streamed:
+            if not self.streams:
+                return response
+            response.response = encoder.stream(response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(encoder.compress(data))
+
+        response.content_encoding = encoder.name
+        # the compressed bytes are another representation of the resource
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+class Compression:
+    # Module-level handle: each app keeps its Compressor in
+    # app.extensions['compression'].
+    def init_app(self, app):
+        levels = {'gzip': app.config.get('COMPRESS_GZIP_LEVEL', 6),
+                  'br': app.config.get('COMPRESS_BR_QUALITY', 4)}
+        encoders = [
+            Encoder(name, levels[name])
+            for name in app.config.get('COMPRESS_ALGORITHMS', ('br', 'gzip'))
+            if name != 'br' or brotli is not None
+        ]
+        if not app.config.get('COMPRESS_ENABLED', True) or not encoders:
+            return
+        app.extensions['compression'] = Compressor(
+            encoders,
+            app.config.get('COMPRESS_MIN_SIZE', 500),
+            app.config.get('COMPRESS_STREAMS', True),
+        )
+        app.after_request(self.compress)
+
+    @staticmethod
+    def compress(response):
+        return current_app.extensions['compression'].compress(response)
+
+
+class CachePolicy:
+    # Each app keeps its HTTP_CACHE_POLICIES in app.extensions['cache_policy'].
+    def init_app(self, app):
+        app.extensions['cache_policy'] = app.config.get('HTTP_CACHE_POLICIES', {})
+        app.after_request(self.apply)
+
+    def policy(self, name):
+        # Tags a view with a policy of HTTP_CACHE_POLICIES; put it between
+        # @app.route and the view (or @page_cache.cached).
+        def decorator(view):
+            view.cache_policy = name
+            return view
+        return decorator
+
+    def apply(self, response):
+        view = current_app.view_functions.get(request.endpoint)
+        name = getattr(view, 'cache_policy', None)
+        if name is None or request.method not in ('GET', 'HEAD') \
+                or response.status_code != 200 or 'Cache-Control' in response.headers:
+            return response
+
+        value = current_app.extensions['cache_policy'].get(name)
+        if value is None:
+            return response
+        if 'public' in value and self.personal():
+            value = 'private, no-cache'
+        response.headers['Cache-Control'] = value
+        if 'no-cache' in value and not response.is_streamed:
+            response.add_etag()
+            response.make_conditional(request)
+        return response
+
+    def personal(self):
+        return (session.modified or '_flashes' in session
+                or session.get(READ_PRIMARY_UNTIL, 0) > time())
+
+
+compression = Compression()
+cache_policy = CachePolicy()
@@ -1,11 +1,67 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from routing import RoutingSession
 
 #----------------------------------------------------------------------------#
 # SQLAlchemy instance
 #----------------------------------------------------------------------------#
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+# shows listed without an end time last this long
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def _default_end_time(context):
+    start_time = context.get_current_parameters().get('start_time')
+    return start_time + DEFAULT_SHOW_DURATION if start_time else None
+
+
+def _no_overlap(column, name):
+    # PostgreSQL: no two shows of the same venue (artist) may overlap. The
+    # id is compared as a one-value range, so the gist index needs no
+    # btree_gist extension.
+    return ExcludeConstraint(
+        (db.func.int4range(column, column, db.literal_column("'[]'")), '='),
+        (db.func.tstzrange(db.column('start_time'), db.column('end_time')), '&&'),
+        name=name, using='gist', where=db.text(f'{column.name} IS NOT NULL'),
+    ).ddl_if(dialect='postgresql')
+
+
+def _has_pg_trgm(ddl, target, bind, **kw):
+    if bind is None:
+        # compiled without a database, e.g. an offline migration
+        return True
+    return bind.execute(db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def _trigram(table, column):
+    # search.py: column ILIKE '%term%'. Left out where pg_trgm cannot be
+    # installed (see _install_pg_trgm); `flask search init` adds it later.
+    return db.Index(
+        f'ix_{table}_{column}_trgm', column,
+        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+    ).ddl_if(dialect='postgresql', callable_=_has_pg_trgm)
+
+
+@event.listens_for(db.metadata, 'before_create')
+def _install_pg_trgm(metadata, connection, **kw):
+    # pg_trgm is a contrib extension, shipped with most PostgreSQL packages
+    if connection.dialect.name != 'postgresql':
+        return
+    if connection.execute(db.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first():
+        connection.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    else:
+        current_app.logger.warning('pg_trgm is not available: venue and artist searches '
+                                   'run without their trigram indexes')
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -27,13 +83,34 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.now())
+    # denormalized show counters, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # venues(): listing grouped by area
+        db.Index('ix_Venue_city_state_name', 'city', 'state', 'name'),
+        # index(): latest venues
+        db.Index('ix_Venue_created_at', 'created_at'),
+        # typeahead lookups: lower(name) LIKE 'prefix%'
+        db.Index('ix_Venue_lower_name', db.func.lower(name).label('lower_name'),
+                 postgresql_ops={'lower_name': 'text_pattern_ops'}),
+        # genre filters and facets: genres @> ARRAY[...]
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        # searches: name/city ILIKE '%term%'
+        _trigram('Venue', 'name'),
+        _trigram('Venue', 'city'),
+    )
 
     shows = db.relationship(
         'Show', 
         back_populates='venue',
         order_by='Show.start_time',
-        lazy='joined', 
-        cascade='all,delete-orphan'
+        lazy='select',
+        cascade='all,delete-orphan',
+        # shows are removed by the ON DELETE CASCADE of Show's foreign keys
+        passive_deletes=True
       )
 
     def __repr__(self):
@@ -50,12 +127,10 @@ class Venue(db.Model):
         setattr(self, key, value)
 
     def num_upcoming_shows(self):
-      return Show.query.filter(Show.start_time > datetime.now(),
-                               Show.venue_id == self.id).count()
+      return self.upcoming_shows_count
 
     def num_past_shows(self):
-      return Show.query.filter(Show.start_time < datetime.now(),
-                               Show.venue_id == self.id).count()
+      return self.past_shows_count
 
     def get_upcoming_shows(self):
       return Show.query.filter(Show.start_time > datetime.now(),
@@ -82,13 +157,35 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.now())
+    # denormalized show counters, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # artists(): keyset pages ordered by name
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_city_state_name', 'city', 'state', 'name'),
+        # index(): latest artists
+        db.Index('ix_Artist_created_at', 'created_at'),
+        # typeahead lookups: lower(name) LIKE 'prefix%'
+        db.Index('ix_Artist_lower_name', db.func.lower(name).label('lower_name'),
+                 postgresql_ops={'lower_name': 'text_pattern_ops'}),
+        # genre filters and facets: genres @> ARRAY[...]
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        # searches: name/city ILIKE '%term%'
+        _trigram('Artist', 'name'),
+        _trigram('Artist', 'city'),
+    )
 
     shows = db.relationship(
         'Show', 
         back_populates='artist', 
         order_by='Show.start_time',
-        lazy='joined', 
-        cascade='all,delete-orphan'
+        lazy='select',
+        cascade='all,delete-orphan',
+        # shows are removed by the ON DELETE CASCADE of Show's foreign keys
+        passive_deletes=True
       )
 
     def __repr__(self):
@@ -105,12 +202,10 @@ class Artist(db.Model):
         setattr(self, key, value)
 
     def num_upcoming_shows(self):
-      return Show.query.filter(Show.start_time > datetime.now(),
-                               Show.artist_id == self.id).count()
+      return self.upcoming_shows_count
 
     def num_past_shows(self):
-      return Show.query.filter(Show.start_time < datetime.now(),
-                               Show.artist_id == self.id).count()
+      return self.past_shows_count
 
     def get_upcoming_shows(self):
       return Show.query.filter(Show.start_time > datetime.now(),
@@ -124,9 +219,28 @@ class Show(db.Model):
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer(), db.ForeignKey('Venue.id'))
-    artist_id = db.Column(db.Integer(), db.ForeignKey('Artist.id'))
+    venue_id = db.Column(db.Integer(), db.ForeignKey('Venue.id', ondelete='CASCADE'))
+    artist_id = db.Column(db.Integer(), db.ForeignKey('Artist.id', ondelete='CASCADE'))
     start_time = db.Column(db.DateTime(timezone=True))
+    end_time = db.Column(db.DateTime(timezone=True), nullable=False, default=_default_end_time)
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+    # the counter the show is counted in (upcoming or past), see counters.py
+    counted_upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    __table_args__ = (
+        # a venue's / an artist's shows, split at now() and ordered by time;
+        # their leading columns also serve the foreign keys and the
+        # overlap checks of booking.py
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # shows(): keyset pages ordered by (start_time, id)
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        # counters.roll_over(): shows still counted as upcoming, by time
+        db.Index('ix_Show_counted_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('counted_upcoming')),
+        _no_overlap(db.column('venue_id'), 'ex_Show_venue_id_overlap'),
+        _no_overlap(db.column('artist_id'), 'ex_Show_artist_id_overlap'),
+    )
 
     venue = db.relationship('Venue', back_populates='shows')
     artist = db.relationship('Artist', back_populates='shows')
@@ -0,0 +1,114 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from flask import current_app, abort
+from sqlalchemy import tuple_
+
+#----------------------------------------------------------------------------#
+# Keyset (cursor) pagination.
+#
+# Pages are selected with a row comparison on the sort keys, e.g.
+# (start_time, id) > (:start_time, :id), so the cost of a page does not
+# depend on its depth the way OFFSET does. The keys must be unique together
+# (end them with the primary key) and the query must not be ordered already.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(values):
+    values = [x.isoformat() if isinstance(x, datetime) else x for x in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, keys):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error):
+        abort(400)
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        abort(400)
+
+    return [_decode_value(key, value) for key, value in zip(keys, values)]
+
+
+def _decode_value(key, value):
+    # A cursor comes from the client: each value must be of its key's type,
+    # or the comparison fails in the database instead of as a 400.
+    if value is None:
+        return None
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        abort(400)
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            abort(400)
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type):
+        abort(400)
+    return value
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, args=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # extra query string arguments the pager links must carry (search terms)
+        self.args = args or {}
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def cursors(self):
+        return {
+            'next': self.next_cursor,
+            'prev': self.prev_cursor,
+        }
+
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=None, args=None):
+    per_page = per_page or current_app.config.get('PAGE_SIZE', 50)
+    # entity queries yield the entity itself, column queries the whole row
+    single_entity = len(query.column_descriptions) == 1 \
+        and query.column_descriptions[0]['entity'] is query.column_descriptions[0]['expr']
+    labels = [f'_cursor_{i}' for i in range(len(keys))]
+
+    if before:
+        values = decode_cursor(before, keys)
+        query = query.filter(tuple_(*keys) < tuple_(*values))\
+                     .order_by(*[key.desc() for key in keys])
+    else:
+        if after:
+            values = decode_cursor(after, keys)
+            query = query.filter(tuple_(*keys) > tuple_(*values))
+        query = query.order_by(*keys)
+
+    query = query.add_columns(*[key.label(label) for key, label in zip(keys, labels)])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    page = Page([row[0] if single_entity else row for row in rows], args=args)
+    if rows:
+        first = encode_cursor([rows[0]._mapping[label] for label in labels])
+        last = encode_cursor([rows[-1]._mapping[label] for label in labels])
+        if before:
+            page.prev_cursor = first if has_more else None
+            page.next_cursor = last
+        else:
+            page.prev_cursor = first if after else None
+            page.next_cursor = last if has_more else None
+    return page
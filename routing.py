@@ -0,0 +1,71 @@
+import random
+from time import time
+from flask import g, request, session, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Replicas are configured as SQLALCHEMY_BINDS named replica_0, replica_1, ...
+# (see DATABASE_REPLICA_URLS in config.py). Inside a GET/HEAD request the
+# session reads from one replica, picked once per request; everything else
+# (writes, flushes, CLI commands, other methods) uses the primary.
+#
+# Replicas lag behind the primary, so after a request commits a write its
+# client keeps reading from the primary for READ_AFTER_WRITE_SECONDS; the
+# deadline is kept in the (cookie) session so it follows the redirect that
+# usually comes after a form post.
+#----------------------------------------------------------------------------#
+
+REPLICA_PREFIX = 'replica_'
+READ_PRIMARY_UNTIL = '_read_primary_until'
+
+
+def replica_keys(engines):
+    return [key for key in engines if key and key.startswith(REPLICA_PREFIX)]
+
+
+def _reads_from_replica():
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    return session.get(READ_PRIMARY_UNTIL, 0) <= time()
+
+
+def read_engine():
+    # Engine for read-only work of the current request, e.g. queries run on
+    # their own connections by run_concurrently().
+    db = current_app.extensions['sqlalchemy']
+    engines = db.engines
+    if not _reads_from_replica():
+        return engines[None]
+    if '_replica_key' not in g:
+        keys = replica_keys(engines)
+        g._replica_key = random.choice(keys) if keys else None
+    return engines[g._replica_key]
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('wrote') \
+                and replica_keys(self._db.engines) and _reads_from_replica():
+            return read_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session_, flush_context):
+    session_.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session_):
+    if session_.info.pop('wrote', False) and has_request_context():
+        delay = current_app.config.get('READ_AFTER_WRITE_SECONDS', 0)
+        if delay:
+            session[READ_PRIMARY_UNTIL] = time() + delay
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session_):
+    session_.info.pop('wrote', None)
@@ -0,0 +1,70 @@
+import calendar
+from datetime import datetime, date, time, timedelta, timezone
+from itertools import groupby
+from sqlalchemy import func
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Date-range and calendar queries over shows.
+#
+# Both are plain range scans on Show.start_time: the listing walks
+# ix_Show_start_time_id in (start_time, id) order and stops after one page,
+# a venue's month reads ix_Show_venue_id_start_time between two bounds, so
+# the work depends on the window (and page size), not on the table size.
+#
+# A BRIN index would not help here: shows are inserted in booking order, not
+# in start_time order, so block ranges would each span most of the calendar.
+#----------------------------------------------------------------------------#
+
+# weeks start on Sunday
+FIRST_WEEKDAY = calendar.SUNDAY
+
+
+def day_start(day):
+    # Days are UTC days, like the stored start times.
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def shows_between(start, end, city='', state=''):
+    # Shows starting in [start, end), with their venue and artist; order with
+    # (Show.start_time, Show.id), e.g. as keyset pagination keys.
+    query = db.session.query(Show.id, Show.start_time,
+                             Show.venue_id, Venue.name.label('venue_name'),
+                             Venue.city.label('venue_city'), Venue.state.label('venue_state'),
+                             Show.artist_id, Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link'))\
+                      .join(Show.venue).join(Show.artist)\
+                      .filter(Show.start_time >= start, Show.start_time < end)
+    city = (city or '').strip()
+    if city:
+        query = query.filter(func.lower(Venue.city) == city.lower())
+    if state:
+        query = query.filter(Venue.state == state)
+    return query
+
+
+def month_bounds(year, month):
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return first, following
+
+
+def venue_month(venue_id, year, month):
+    # Calendar grid of a venue's month: a list of weeks, each a list of
+    # (day, shows starting that day) for the seven days of the week; days of
+    # the neighbouring months are included to fill the first and last weeks.
+    weeks = calendar.Calendar(FIRST_WEEKDAY).monthdatescalendar(year, month)
+
+    shows = db.session.query(Show.id, Show.start_time,
+                             Show.artist_id, Artist.name.label('artist_name'))\
+                      .join(Show.artist)\
+                      .filter(Show.venue_id == venue_id,
+                              Show.start_time >= day_start(weeks[0][0]),
+                              Show.start_time < day_start(weeks[-1][-1] + timedelta(days=1)))\
+                      .order_by(Show.start_time, Show.id).all()
+
+    by_day = {
+        day: list(group)
+        for day, group in groupby(shows, key=lambda x: x.start_time.astimezone(timezone.utc).date())
+    }
+    return [[(day, by_day.get(day, [])) for day in week] for week in weeks]
@@ -0,0 +1,135 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, case, text, cast, select, union_all, literal, String
+from models import Venue, Artist, db
+from enums import Genres, States
+
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# Matching is case-insensitive substring matching on name and city, plus an
+# exact state filter, exactly like the former ilike('%term%') queries (the
+# term is matched literally, '%' and '_' are not wildcards).
+#
+# The ilike filters are served by the pg_trgm GIN indexes declared on the
+# models; `flask search init` (re)creates them on a database set up before
+# pg_trgm was installed.
+#
+# Genre filters (all selected genres must match) and the facet counts are
+# plain SQL on the genres array, served by the GIN indexes on
+# Venue.genres and Artist.genres.
+#----------------------------------------------------------------------------#
+
+MODELS = (Venue, Artist)
+INDEXED_COLUMNS = ('name', 'city')
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def search_query(model, name='', city='', state='', genres=()):
+    # Returns an unordered query of matching rows; see sort_keys() for ordering.
+    # Rows must have every one of `genres` (served by the GIN index on genres).
+    name = (name or '').strip()
+    city = (city or '').strip()
+    state = state or ''
+
+    query = model.query
+    if name:
+        query = query.filter(model.name.ilike(f'%{_escape_like(name)}%', escape='\\'))
+    if city:
+        query = query.filter(model.city.ilike(f'%{_escape_like(city)}%', escape='\\'))
+    if state:
+        query = query.filter(model.state == state)
+
+    if genres:
+        # genres @> CAST(... AS VARCHAR[]); the generic ARRAY type has no contains()
+        query = query.filter(model.genres.bool_op('@>')(cast(list(genres), model.genres.type)))
+    return query
+
+
+def sort_keys(model, name=''):
+    # Relevance order: names starting with the term first, then by name. The
+    # keys are exact values, so they can also drive keyset pagination.
+    name = (name or '').strip().lower()
+    if not name:
+        return [model.name, model.id]
+    prefix = case(
+        (func.lower(model.name).like(f'{_escape_like(name)}%', escape='\\'), 0),
+        else_=1,
+    )
+    return [prefix, model.name, model.id]
+
+
+def search(model, name='', city='', state='', genres=()):
+    return search_query(model, name, city, state, genres).order_by(*sort_keys(model, name)).all()
+
+
+def facets(query, model):
+    # Number of matching rows, and of matching rows per genre and per state,
+    # in one statement over the search query. Genres and states are listed
+    # in enum order, those without matches left out.
+    matches = query.with_entities(model.genres.label('genres'), model.state.label('state'))\
+                   .order_by(None).cte('matches')
+    genre_values = select(func.unnest(matches.c.genres).label('value')).subquery()
+    rows = db.session.execute(union_all(
+        select(literal('total'), literal(None, String), func.count())
+            .select_from(matches),
+        select(literal('genres'), genre_values.c.value, func.count())
+            .group_by(genre_values.c.value),
+        select(literal('states'), matches.c.state, func.count())
+            .group_by(matches.c.state),
+    )).all()
+
+    counts = {'genres': {}, 'states': {}}
+    total = 0
+    for facet, value, count in rows:
+        if facet == 'total':
+            total = count
+        else:
+            counts[facet][value] = count
+    return {
+        'total': total,
+        'genres': [(x, counts['genres'][x]) for x in Genres.validation_list() if x in counts['genres']],
+        'states': [(x, counts['states'][x]) for x in States.validation_list() if x in counts['states']],
+    }
+
+
+def lookup(model, prefix, limit=10):
+    # Typeahead: the first `limit` names starting with prefix.
+    prefix = (prefix or '').strip().lower()
+    if not prefix:
+        return []
+    return db.session.query(model.id, model.name)\
+                     .filter(func.lower(model.name).like(f'{_escape_like(prefix)}%', escape='\\'))\
+                     .order_by(model.name, model.id)\
+                     .limit(limit).all()
+
+
+#----------------------------------------------------------------------------#
+# PostgreSQL index setup.
+#----------------------------------------------------------------------------#
+
+search_cli = AppGroup('search', help='Manage search indexes.')
+
+@search_cli.command('init')
+def init_command():
+    """Install pg_trgm and the trigram GIN indexes (PostgreSQL only)."""
+    if not _is_postgres():
+        click.echo('Not a PostgreSQL database: nothing to do.')
+        return
+
+    connection = db.session.connection()
+    connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    indexes = {index.name: index for model in MODELS for index in model.__table__.indexes}
+    for model in MODELS:
+        for column in INDEXED_COLUMNS:
+            index = indexes[f'ix_{model.__tablename__}_{column}_trgm']
+            index.create(connection, checkfirst=True)
+            click.echo(f'{index.name}: ok')
+    db.session.commit()
@@ -2,3 +2,39 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead inputs: <input data-lookup="/artists/lookup/" data-target="artist_id" list="...">
+// suggest names from the lookup endpoint and store the chosen id in the target field.
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-lookup]');
+
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var target = document.getElementById(input.getAttribute('data-target'));
+    var timer = null;
+    var ids = {};
+
+    input.addEventListener('input', function () {
+      target.value = ids[input.value] || '';
+      clearTimeout(timer);
+      if (input.value.trim() === '' || ids[input.value]) {
+        return;
+      }
+      timer = setTimeout(function () {
+        var url = input.getAttribute('data-lookup') + '?q=' + encodeURIComponent(input.value);
+        fetch(url)
+          .then(function (response) { return response.json(); })
+          .then(function (result) {
+            list.innerHTML = '';
+            result.data.forEach(function (item) {
+              var option = document.createElement('option');
+              option.value = item.name;
+              ids[item.name] = item.id;
+              list.appendChild(option);
+            });
+            target.value = ids[input.value] || '';
+          });
+      }, 150);
+    });
+  });
+});
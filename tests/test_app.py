@@ -0,0 +1,24 @@
+import os
+from conftest import StatementCounter, make_app
+from models import db
+
+
+def test_apps_keep_their_own_caches(app):
+    cached = make_app(PAGE_CACHE_ENABLED=True)
+
+    for each, statements in ((cached, 0), (app, 1)):
+        client = each.test_client()
+        client.get('/venues/')
+        with each.app_context():
+            engine = db.engine
+        with StatementCounter(engine) as counter:
+            assert client.get('/venues/').status_code == 200
+        assert len(counter) == statements
+
+
+def test_create_app_registers_no_fork_hook(app, monkeypatch):
+    hooks = []
+    monkeypatch.setattr(os, 'register_at_fork', lambda **kwargs: hooks.append(kwargs))
+    make_app()
+    make_app()
+    assert hooks == []
@@ -0,0 +1,38 @@
+VENUE = {
+    'name': 'Cached Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+    'phone': '512-555-0100', 'genres': ['Jazz'], 'facebook_link': '', 'image_link': '',
+    'website': '', 'seeking_description': '',
+}
+
+
+def test_listing_may_be_served_stale(app):
+    response = app.test_client().get('/venues/')
+    assert response.headers['Cache-Control'] == 'public, max-age=60, stale-while-revalidate=300'
+
+
+def test_home_is_revalidated(app):
+    client = app.test_client()
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    assert response.headers['ETag']
+
+    response = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_redirect_after_write_is_private(app):
+    app.config['READ_AFTER_WRITE_SECONDS'] = 5
+    client = app.test_client()
+    response = client.post('/venues/create/', data=VENUE)
+    assert response.status_code == 302
+
+    # shows the flash
+    response = client.get('/')
+    assert 'Cached Venue' in response.get_data(as_text=True)
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    # reads its own write
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    # other clients share the public copy
+    response = app.test_client().get('/')
+    assert response.headers['Cache-Control'] == 'public, no-cache'
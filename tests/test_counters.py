@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+from booking import book
+from counters import roll_over_counters, reconcile_counters
+from deletion import delete_shows
+from models import Venue, Artist, Show, db
+
+
+def counters(model, id):
+    db.session.expire_all()
+    row = db.session.get(model, id)
+    return row.upcoming_shows_count, row.past_shows_count
+
+
+def add_parents():
+    venue = Venue(name='Venue', city='Austin', state='TX', genres=['Jazz'])
+    artist = Artist(name='Artist', city='Austin', state='TX', genres=['Jazz'])
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    return venue.id, artist.id
+
+
+def test_deleting_a_show_that_started_since_it_was_counted(app):
+    with app.app_context():
+        venue_id, artist_id = add_parents()
+        show = Show(venue_id=venue_id, artist_id=artist_id,
+                    start_time=datetime.now(timezone.utc) + timedelta(hours=1))
+        db.session.add(show)
+        db.session.commit()
+        # time passes without a roll-over: the show is still counted upcoming
+        db.session.execute(db.update(Show).values(start_time=Show.start_time - timedelta(days=1),
+                                                  end_time=Show.end_time - timedelta(days=1)))
+        db.session.commit()
+        assert counters(Venue, venue_id) == (1, 0)
+
+        db.session.delete(db.session.get(Show, show.id))
+        db.session.commit()
+        assert counters(Venue, venue_id) == (0, 0)
+        assert counters(Artist, artist_id) == (0, 0)
+
+
+def test_roll_over_moves_started_shows_once(app):
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        venue_id, artist_id = add_parents()
+        book(venue_id, artist_id, [(now + timedelta(hours=1), now + timedelta(hours=2)),
+                                   (now + timedelta(days=2), now + timedelta(days=2, hours=2))])
+        assert counters(Venue, venue_id) == (2, 0)
+
+        later = now + timedelta(days=1)
+        with db.engine.begin() as connection:
+            assert roll_over_counters(connection, later) == 1
+        with db.engine.begin() as connection:
+            assert roll_over_counters(connection, later) == 0
+        assert counters(Venue, venue_id) == (1, 1)
+        assert counters(Artist, artist_id) == (1, 1)
+
+        # bulk deletion takes each show out of the counter it is counted in
+        delete_shows(Show.venue_id == venue_id)
+        assert counters(Venue, venue_id) == (0, 0)
+        assert counters(Artist, artist_id) == (0, 0)
+
+
+def test_counters_match_reconciliation(app):
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        venue_id, artist_id = add_parents()
+        book(venue_id, artist_id, [(now + timedelta(weeks=i), now + timedelta(weeks=i, hours=2))
+                                   for i in range(-2, 3)])
+        show = db.session.query(Show).filter(Show.start_time > now).order_by(Show.start_time).first()
+        show.start_time -= timedelta(weeks=5)
+        show.end_time -= timedelta(weeks=5)
+        db.session.commit()
+        assert counters(Venue, venue_id) == (1, 4)
+        assert reconcile_counters(now) == {'Show': 0, 'Venue': 0, 'Artist': 0}
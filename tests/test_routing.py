@@ -0,0 +1,79 @@
+import pytest
+from conftest import TEST_DATABASE_URL, StatementCounter, make_app, reset_tables
+from models import Venue, db
+
+# The replica is a second engine on the test database: statements are told
+# apart by the engine that runs them.
+
+VENUE = {
+    'name': 'Routed Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+    'phone': '512-555-0100', 'genres': ['Jazz'], 'facebook_link': '', 'image_link': '',
+    'website': 'https://routed-venue.example.com', 'seeking_description': '',
+}
+
+
+@pytest.fixture
+def replicated():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    def build(**config):
+        app = make_app(SQLALCHEMY_BINDS={'replica_0': TEST_DATABASE_URL}, **config)
+        reset_tables(app)
+        with app.app_context():
+            engines = db.engines[None], db.engines['replica_0']
+        return app, engines
+    return build
+
+
+def run(engines, request):
+    primary, replica = engines
+    with StatementCounter(primary) as on_primary, StatementCounter(replica) as on_replica:
+        response = request()
+    return response, len(on_primary), len(on_replica)
+
+
+def test_get_reads_from_replica(replicated):
+    app, engines = replicated()
+    response, primary, replica = run(engines, lambda: app.test_client().get('/venues/'))
+    assert response.status_code == 200
+    assert (primary, replica) == (0, 1)
+
+
+def test_post_writes_to_primary(replicated):
+    app, engines = replicated()
+    response, primary, replica = run(
+        engines, lambda: app.test_client().post('/venues/create/', data=VENUE))
+    assert response.status_code == 302
+    assert primary > 0 and replica == 0
+
+
+def test_reads_follow_own_write_to_primary(replicated):
+    app, engines = replicated(READ_AFTER_WRITE_SECONDS=5)
+    client = app.test_client()
+    client.post('/venues/create/', data=VENUE)
+
+    response, primary, replica = run(engines, lambda: client.get('/venues/'))
+    assert 'Routed Venue' in response.get_data(as_text=True)
+    assert (primary, replica) == (1, 0)
+    # other clients keep reading from the replica
+    _, primary, replica = run(engines, lambda: app.test_client().get('/venues/'))
+    assert (primary, replica) == (0, 1)
+
+
+def test_no_read_after_write_window(replicated):
+    app, engines = replicated(READ_AFTER_WRITE_SECONDS=0)
+    client = app.test_client()
+    client.post('/venues/create/', data=VENUE)
+    _, primary, replica = run(engines, lambda: client.get('/venues/'))
+    assert (primary, replica) == (0, 1)
+
+
+def test_outside_requests_use_primary(replicated):
+    app, engines = replicated()
+
+    def query():
+        with app.app_context():
+            return db.session.query(Venue).count()
+    _, primary, replica = run(engines, query)
+    assert primary == 1 and replica == 0
@@ -0,0 +1,37 @@
+from conftest import StatementCounter
+from models import Venue, db
+
+
+def add_venues(app, count, start=0):
+    with app.app_context():
+        db.session.add_all([
+            Venue(name=f'Venue {i}', city=('Austin', 'Boston', 'Chicago')[i % 3], state='TX',
+                  genres=['Jazz'])
+            for i in range(start, start + count)
+        ])
+        db.session.commit()
+
+
+def venues_page_statements(app):
+    with app.app_context():
+        engine = db.engine
+    with StatementCounter(engine) as counter:
+        response = app.test_client().get('/venues/')
+    assert response.status_code == 200
+    return len(counter)
+
+
+def test_venue_directory_runs_constant_statements(app):
+    add_venues(app, 1)
+    one = venues_page_statements(app)
+    add_venues(app, 60, start=1)
+    many = venues_page_statements(app)
+    assert one == many == 1
+
+
+def test_venue_directory_groups_by_area(app):
+    add_venues(app, 6)
+    body = app.test_client().get('/venues/').get_data(as_text=True)
+    for i in range(6):
+        assert f'Venue {i}' in body
+    assert body.index('Austin') < body.index('Boston') < body.index('Chicago')
@@ -0,0 +1,54 @@
+import os
+from datetime import datetime, timezone
+from jinja2 import FileSystemBytecodeCache
+from models import db
+from datefmt import format_datetime, PATTERNS
+
+#----------------------------------------------------------------------------#
+# Cold start.
+#
+# Templates are compiled to Python bytecode on first use; with the
+# bytecode cache (TEMPLATE_BYTECODE_CACHE) the result is kept on disk, in
+# the instance folder by default, and every later process (worker, new
+# instance from the same image) loads it instead of compiling again.
+#
+# With WARMUP (FLASK_WARMUP=true) create_app() also loads every template,
+# the date formats and the URL map before returning, so with gunicorn's
+# preload_app the workers are forked warm. Connection pools cannot be
+# filled before the fork (the connections would belong to the master):
+# gunicorn.conf.py fills them in each worker before it accepts requests.
+#----------------------------------------------------------------------------#
+
+
+def init_bytecode_cache(app):
+    # Must run before app.jinja_env is first used.
+    directory = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR') \
+        or os.path.join(app.instance_path, 'jinja')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directory)}
+
+
+def compile_templates(app):
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app):
+    compile_templates(app)
+    # Babel's locale data and the parsed patterns
+    now = datetime.now(timezone.utc)
+    for format in PATTERNS:
+        format_datetime(now, format)
+    app.url_map.update()
+
+
+def prime_pools(app):
+    # Opens pool_size connections per engine and returns them to the pool.
+    with app.app_context():
+        for engine in db.engines.values():
+            size = engine.pool.size() if hasattr(engine.pool, 'size') else 1
+            connections = [engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Cooperative (gevent) serving mode.
+#
+#   gunicorn -k gevent --worker-connections 100 -w 2 wsgi_gevent:app
+#
+# psycopg2 is made green, so a worker waiting on the database switches to
+# another request instead of blocking, and one process serves many
+# concurrent requests with the regular (sync) views.
+#----------------------------------------------------------------------------#
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from app import create_app
+
+app = create_app()